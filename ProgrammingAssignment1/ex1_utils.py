@@ -1,38 +1,129 @@
 from IPython.display import clear_output
+from array import array
+from collections import OrderedDict, deque
+import csv
+import heapq
+import mmap
+import os
+import random
+import struct
 import time
+import tracemalloc
+
+_REMOVED = object() # placeholder for invalidated priority queue entries
+
+DIRECTIONS = ((0, 1, "up"), (-1, 0, "left"), (0, -1, "down"), (1, 0, "right")) # we can move in 4 directions as (dx, dy, action)
+_ACTIONS = {(dx, dy): action for dx, dy, action in DIRECTIONS}
+INF = float("inf")
+
+# Cell flags used by CompactGrid and the map files
+BLOCKED = 1
+GOAL = 2
+INITIAL = 4
+
+# Search trace event kinds
+TRACE_EXPAND = 0 # the node was expanded
+TRACE_REACH = 1 # the node was reached for the first time
+
+# Plain-text map characters and their flags
+MAP_SYMBOLS = {".": 0, "#": BLOCKED, "G": GOAL, "S": INITIAL}
+_MAP_TO_FLAGS = bytes(MAP_SYMBOLS.get(chr(i), 0) for i in range(256))
+_FLAGS_TO_MAP = bytes(next((ord(s) for s, f in MAP_SYMBOLS.items() if f == i), ord("#")) for i in range(256))
+
+# Binary map header: magic, xlim, ylim, initial cell id, goal cell id
+BINARY_MAP_MAGIC = b"GRD1"
+BINARY_MAP_HEADER = struct.Struct("<4sIIqq")
 
 class PriorityQueue:
     """
-    A simple priority queue implementation using a list.
-    Elements are stored as tuples (item, priority) where lower priority values indicate higher priority.
+    A priority queue implementation using a binary heap.
+    Elements are stored as entries [priority, count, element, keyed] where lower priority values indicate higher
+    priority. Elements with equal priority are popped in insertion order (stable tie-breaking).
+    push only ever adds an entry, so an element can be queued several times. update keeps at most one entry per
+    element and replaces its priority, invalidating the old entry lazily so it is skipped when it reaches the top of
+    the heap; elements queued with update must therefore be hashable. contains, priority and remove only see the
+    elements queued with update.
     """
     def __init__(self):
-        self.__data = []
-    
+        self.__data = [] # heap of [priority, count, element, keyed] entries
+        self.__entries = {} # maps each element queued with update to its live entry
+        self.__count = 0 # insertion counter used for tie-breaking
+        self.__size = 0 # number of live entries
+
     def push(self, element, priority):
         """
-        Push an element into the priority queue and sort by priority.
+        Push an element into the priority queue.
+        """
+        heapq.heappush(self.__data, [priority, self.__count, element, False])
+        self.__count += 1
+        self.__size += 1
+
+    def update(self, element, priority, decrease_only=True):
+        """
+        Decrease-key: push the element if it was not queued with update, or replace its priority if the new one is
+        lower (or different, when decrease_only is False).
+        Returns True if the queue was changed, False otherwise.
+        """
+        entry = self.__entries.get(element)
+        if entry is not None:
+            if entry[0] <= priority if decrease_only else entry[0] == priority:
+                return False
+            entry[2] = _REMOVED
+            self.__size -= 1
+        entry = [priority, self.__count, element, True]
+        self.__count += 1
+        self.__size += 1
+        self.__entries[element] = entry
+        heapq.heappush(self.__data, entry)
+        return True
+
+    def remove(self, element):
+        """
+        Remove the element queued with update from the queue.
+        Returns True if the element was in the queue, False otherwise.
+        """
+        entry = self.__entries.pop(element, None)
+        if entry is None:
+            return False
+        entry[2] = _REMOVED
+        self.__size -= 1
+        return True
+
+    def contains(self, element):
+        """
+        Check if the element is currently in the priority queue through update.
         """
-        self.__data.append((element, priority))
-        self.__data.sort(key=lambda x: x[1])
+        return element in self.__entries
+
+    def priority(self, element):
+        """
+        Returns the current priority of the element queued with update, or None if it is not in the queue.
+        """
+        entry = self.__entries.get(element)
+        return entry[0] if entry is not None else None
 
     def pop(self):
         """
         Pop the element with the highest priority (lowest number) from the queue.
-        Returns the item part of the tuple (item, priority).
         If the queue is empty, returns None.
         """
-        if len(self.__data) > 0:
-            return self.__data.pop(0)[0]
+        self.__discard_removed()
+        if self.__data:
+            _, _, element, keyed = heapq.heappop(self.__data)
+            if keyed:
+                del self.__entries[element]
+            self.__size -= 1
+            return element
         else:
             return None
-    
+
     def read(self):
         """
         Read the element with the highest priority without removing it from the queue.
         """
-        if len(self.__data) > 0:
-            return self.__data[0][0]
+        self.__discard_removed()
+        if self.__data:
+            return self.__data[0][2]
         else:
             return None
 
@@ -41,24 +132,142 @@ class PriorityQueue:
         Check if the priority queue is empty.
         Returns True if empty, False otherwise.
         """
-        return len(self.__data) == 0
+        return self.__size == 0
+
+    def __discard_removed(self):
+        """
+        Drops invalidated entries from the top of the heap.
+        """
+        while self.__data and self.__data[0][2] is _REMOVED:
+            heapq.heappop(self.__data)
+
+    def __contains__(self, element):
+        return element in self.__entries
+
+    def __len__(self):
+        return self.__size
+
+class SearchTrace:
+    """
+    A compact record of the events of a search as (step, cell id, event kind) triples.
+    The step is the expansion count at the time of the event and the cell id is (ylim-1-y) * xlim + x.
+    The events are stored in preallocated parallel arrays that double in size when full.
+    """
+    def __init__(self, capacity=4096):
+        self.steps = array("i", [0]) * capacity
+        self.cells = array("i", [0]) * capacity
+        self.kinds = bytearray(capacity)
+        self.length = 0 # number of recorded events
+
+    def record(self, step, cell, kind):
+        """
+        Appends an event to the trace.
+        """
+        i = self.length
+        if i == len(self.kinds):
+            extra = max(i, 1)
+            self.steps.extend(array("i", [0]) * extra)
+            self.cells.extend(array("i", [0]) * extra)
+            self.kinds.extend(bytes(extra))
+        self.steps[i] = step
+        self.cells[i] = cell
+        self.kinds[i] = kind
+        self.length = i + 1
+
+    def clear(self):
+        """
+        Removes all events while keeping the allocated buffers.
+        """
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield (self.steps[i], self.cells[i], self.kinds[i])
+
+def read_map(path):
+    """
+    Reads a plain-text map file and returns (xlim, ylim, flags, initial, goal).
+    Each line is one row of the grid from top to bottom and each character one cell:
+    "." is free, "#" (or "■") is blocked, "S" is the initial cell and "G" is the goal cell.
+    Spaces between cells are ignored.
+    flags is a bytearray with one byte of flags per cell, and initial and goal are cell ids (-1 if missing).
+    """
+    rows = []
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.rstrip(b"\r\n").replace(b"\xe2\x96\xa0", b"#").replace(b" ", b"")
+            if not line:
+                continue
+            invalid = line.translate(None, b".#SG")
+            if invalid:
+                raise ValueError(f"Invalid map character {invalid[:1]!r} in row {len(rows)} of {path}")
+            if rows and len(line) != len(rows[0]):
+                raise ValueError(f"Row {len(rows)} of {path} has {len(line)} cells, expected {len(rows[0])}")
+            rows.append(line)
+    if not rows:
+        raise ValueError(f"{path} contains no map rows")
+    text = b"".join(rows)
+    for symbol in (b"S", b"G"):
+        if text.count(symbol) > 1:
+            raise ValueError(f"{path} contains more than one {symbol.decode()} cell")
+    return len(rows[0]), len(rows), bytearray(text.translate(_MAP_TO_FLAGS)), text.find(b"S"), text.find(b"G")
+
+def _search_state(name):
+    """
+    Returns a property for per-search node state stored in the "_name" slot.
+    The node is reset lazily on first access after the grid's epoch has moved on, which makes Grid.reset constant time.
+    """
+    attribute = "_" + name
+    def getter(self):
+        if self._epoch != self.grid.epoch:
+            self.reset()
+        return getattr(self, attribute)
+    def setter(self, value):
+        if self._epoch != self.grid.epoch:
+            self.reset()
+        setattr(self, attribute, value)
+    return property(getter, setter)
+
+class _ReachedSet:
+    """
+    The set of nodes reached during the current search, stored as an epoch stamp on each node.
+    Nodes stamped with an older epoch are not in the set, so clearing it is done by advancing the grid's epoch.
+    """
+    def __init__(self, grid):
+        self.grid = grid
+
+    def add(self, node):
+        node._reached_epoch = self.grid.epoch
+
+    def __contains__(self, node):
+        return node._reached_epoch == self.grid.epoch
 
 class Node:
     """
     Represents a node in the grid.
     """
+    __slots__ = ("coords", "grid", "initial", "goal", "blocked", "_epoch", "_reached_epoch",
+                 "_successors", "_parent", "_action", "_current", "_h", "_g")
+
+    # Per-search state, reset lazily when the grid is reset
+    successors = _search_state("successors") # list of Node objects
+    parent = _search_state("parent") # Node object
+    action = _search_state("action") # string representing the action taken to reach this node from the parent node
+    current = _search_state("current") # boolean indicating whether this node is the current state
+    h = _search_state("h") # heuristic value for this node
+    g = _search_state("g") # path cost
+
     def __init__(self, grid, coords=(0, 0), goal=False, initial=False, blocked=False):
         self.coords = coords # coordinates represented as (x, y)
-        self.successors = [] # list of Node objects
         self.grid = grid # reference to the grid where this node is located
-        self.parent = None #Node object
-        self.action = None # string representing the action taken to reach this node from the parent node
         self.initial = initial # boolean indicating whether this node is the initial state
         self.goal = goal # boolean indicating whether this node is a goal state
         self.blocked = blocked # boolean indicating whether this node is blocked
-        self.current = False # boolean indicating whether this node is the current state
-        self.h = None # heuristic value for this node
-        self.g = 0 # path cost
+        self._reached_epoch = -1 # grid epoch in which this node was last reached
+        self.reset()
 
     def expand(self, reached=[]):
         """
@@ -66,46 +275,60 @@ class Node:
         Returns a list of successor nodes that can be reached from the current node.
         Also does internal bookkeeping for returning the path to the goal as well as visualization purposes.
         """
-        self.current = True
-        self.grid.expansions += 1
-        self.grid._reached.add(self)
-        directions = [(0, 1), (-1, 0), (0, -1), (1, 0)] # we can move in 4 directions (right, down, left, up)
-        for dx, dy in directions:
-            if (dx, dy) == (0, 1):
-                action = "up"
-            elif (dx, dy) == (-1, 0):
-                action = "left"
-            elif (dx, dy) == (0, -1):
-                action = "down"
-            elif (dx, dy) == (1, 0):
-                action = "right"
-            new_coords = [self.coords[0] + dx, self.coords[1] + dy] # move one square in the specified direction
-            if (new_coords[0] < self.grid.xlim and new_coords[0] >= 0 and new_coords[1] < self.grid.ylim and new_coords[1] >= 0): # check if the new state is within bounds
-                new_node = self.grid.nodes[self.grid.ylim-1-new_coords[1]][new_coords[0]]
-                if new_node.parent is None and new_node not in self.grid._reached:
-                    new_node.parent = self
+        grid = self.grid
+        epoch = grid.epoch
+        if self._epoch != epoch:
+            self.reset()
+        grid.expansions += 1
+        self._reached_epoch = epoch
+        successors = self._successors = [] # rebuild the list so that expanding a node twice does not duplicate successors
+        x, y = self.coords
+        parent_coords = self._parent.coords if self._parent else None
+        trace = grid.trace
+        if trace is not None:
+            trace.record(grid.expansions, (grid.ylim-1-y) * grid.xlim + x, TRACE_EXPAND)
+        for dx, dy, action in DIRECTIONS:
+            new_x, new_y = x + dx, y + dy # move one square in the specified direction
+            if 0 <= new_x < grid.xlim and 0 <= new_y < grid.ylim: # check if the new state is within bounds
+                new_node = grid.nodes[grid.ylim-1-new_y][new_x]
+                if new_node._epoch != epoch:
+                    new_node.reset()
+                if new_node._parent is None and new_node._reached_epoch != epoch:
+                    new_node._parent = self
+                    if trace is not None and not new_node.blocked:
+                        trace.record(grid.expansions, (grid.ylim-1-new_y) * grid.xlim + new_x, TRACE_REACH)
                 # Make sure the new node is not blocked and ignore the parent node
-                if (not new_node.blocked and (new_node.coords != self.parent.coords if self.parent else True)):
-                    if not new_node.action:
-                        new_node.action = action
-                    self.successors.append(new_node)  
-   
-        if self.grid.search_visualization:
-            self.grid.visualize(self.grid.search_delay)
-        self.current = False
-        return self.successors
-    
+                if not new_node.blocked and new_node.coords != parent_coords:
+                    if not new_node._action:
+                        new_node._action = action
+                    successors.append(new_node)
+
+        if grid.search_visualization:
+            self._current = True
+            grid.visualize(grid.search_delay)
+        self._current = False
+        return successors
+
     def reset(self):
         """
         Resets the node's properties to their initial state.
         """
-        self.successors = []
-        self.parent = None
-        self.current = False
-        self.action = None
-        self.h = None
-        self.g = 0
-    
+        self._epoch = self.grid.epoch
+        self._successors = []
+        self._parent = None
+        self._current = False
+        self._action = None
+        self._h = None
+        self._g = 0
+
+    def set_parent(self, parent):
+        """
+        Makes the given adjacent node the parent of this node, e.g. when a cheaper path to this node is found,
+        and sets the action taken to reach this node from it.
+        """
+        self.parent = parent
+        self.action = _ACTIONS[(self.coords[0] - parent.coords[0], self.coords[1] - parent.coords[1])]
+
     def goal_test(self):
         """
         Returns True if the node is a goal state, False otherwise.
@@ -119,14 +342,18 @@ class Grid:
     """
     Represents a grid of nodes where the search will take place.
     """
-    def __init__(self):
+    def __init__(self, xlim=40, ylim=21):
         self.nodes = []
         self.expansions = 0
-        self.xlim = 40
-        self.ylim = 21
+        self.xlim = xlim
+        self.ylim = ylim
         self.search_visualization = False
         self.search_delay = 0.1
-        self._reached = set() # internal bookkeeping
+        self.epoch = 0 # search generation, advanced on every reset
+        self._reached = _ReachedSet(self) # internal bookkeeping
+        self._initial = None # initial node, indexed when the nodes are generated
+        self._goal = None # goal node, indexed when the nodes are generated
+        self.trace = None # SearchTrace recording the search events, None when tracing is disabled
 
     def generate_nodes(self):
         """
@@ -139,10 +366,12 @@ class Grid:
                 # Define goal state:
                 if (node.coords[0] == 30 and node.coords[1] == 14):
                     node.goal = True
+                    self._goal = node
                 # Define initial state:
                 elif (node.coords[0] == 10 and node.coords[1] == 12):
                     node.initial = True
                     node.current = True
+                    self._initial = node
                 # Define blocked nodes:
                 elif (
                     (x > 12 and x < 27 and y == 5) or 
@@ -165,28 +394,82 @@ class Grid:
                 row.append(node)
             self.nodes.append(row)
 
+    def generate_random_nodes(self, density=0.2, seed=None):
+        """
+        Generates a random grid of nodes where each node is blocked with the given probability.
+        The initial and goal nodes are placed on two distinct random unblocked nodes. The same seed gives the same grid.
+        """
+        rng = random.Random(seed)
+        self.nodes = []
+        for y in range(self.ylim):
+            self.nodes.append([Node(self, (x, (self.ylim-1)-y), blocked=rng.random() < density) for x in range(self.xlim)])
+        free = [node for row in self.nodes for node in row if not node.blocked]
+        if len(free) < 2:
+            raise ValueError(f"Density {density} leaves fewer than two unblocked nodes.")
+        self._initial, self._goal = rng.sample(free, 2)
+        self._initial.initial = True
+        self._initial.current = True
+        self._goal.goal = True
+
+    def load_map(self, path):
+        """
+        Generates the grid of nodes from a plain-text map file (see read_map for the format).
+        The grid size is taken from the file.
+        """
+        self.xlim, self.ylim, flags, initial, goal = read_map(path)
+        self.nodes = []
+        self._initial = None
+        self._goal = None
+        cell = 0
+        for y in range(self.ylim):
+            row = []
+            for x in range(self.xlim):
+                flag = flags[cell]
+                node = Node(self, (x, (self.ylim-1)-y), goal=bool(flag & GOAL), initial=bool(flag & INITIAL), blocked=bool(flag & BLOCKED))
+                if cell == initial:
+                    node.current = True
+                    self._initial = node
+                if cell == goal:
+                    self._goal = node
+                row.append(node)
+                cell += 1
+            self.nodes.append(row)
+
+    def get_node(self, coords):
+        """
+        Returns the node at the given (x, y) coordinates, or None if they are out of bounds.
+        """
+        if 0 <= coords[0] < self.xlim and 0 <= coords[1] < self.ylim:
+            return self.nodes[self.ylim-1-coords[1]][coords[0]]
+        return None
+
     def get_initial(self):
         """
         Returns the initial node in the grid.
         If no initial node is found, returns None.
         """
-        for row in self.nodes:
-            for node in row:
-                if node.initial:
-                    return node
-        return None
+        if self._initial is None or not self._initial.initial:
+            self._initial = next((node for row in self.nodes for node in row if node.initial), None)
+        return self._initial
 
     def get_goal(self):
         """
         Returns the goal node in the grid.
         If no goal node is found, returns None.
         """
-        for row in self.nodes:
-            for node in row:
-                if node.goal:
-                    return node
-        return None
+        if self._goal is None or not self._goal.goal:
+            self._goal = next((node for row in self.nodes for node in row if node.goal), None)
+        return self._goal
     
+    def set_blocked(self, coords, value):
+        """
+        Sets whether the node at the given (x, y) coordinates is blocked.
+        """
+        node = self.get_node(coords)
+        if node is None:
+            raise ValueError(f"Coordinates {coords} are out of bounds.")
+        node.blocked = value
+
     def set_search_visualization(self, value):
         """
         Sets whether the search visualization is enabled or not.
@@ -199,15 +482,22 @@ class Grid:
         """
         self.search_delay = delay
 
+    def set_search_trace(self, value, capacity=4096):
+        """
+        Sets whether the search events are recorded in grid.trace for replaying after the search.
+        Unlike the search visualization, recording does not slow the search down noticeably.
+        """
+        self.trace = SearchTrace(capacity) if value else None
+
     def reset(self):
         """
-        Resets the grid to its initial state by resetting all nodes and the expansion count.
+        Resets the grid to its initial state by resetting all nodes, the expansion count and the search trace.
+        This takes constant time: advancing the epoch makes every node reset itself lazily on its next access.
         """
-        for row in self.nodes:
-            for node in row:
-                node.reset()
+        self.epoch += 1
         self.expansions = 0
-        self._reached = set()
+        if self.trace is not None:
+            self.trace.clear()
 
     def visualize(self, delay=0):
         """
@@ -218,3 +508,926 @@ class Grid:
             print(" ".join("@" if node.current else "S" if node.initial else "G" if node.goal else "■" if node.blocked else "x" if node in self._reached else "." for node in row))
         time.sleep(delay)
 
+    def replay(self, trace=None, delay=0.1, result=None, every=1):
+        """
+        Replays a recorded search trace with print statements, showing a frame after every `every`th expansion.
+        Expanded nodes are shown as "x" and reached but unexpanded nodes as "o".
+        If the goal node returned by the search is given, the last frame also shows the path to it.
+        """
+        trace = trace if trace is not None else self.trace
+        if trace is None:
+            raise ValueError("No search trace recorded. Enable it with set_search_trace(True) before searching.")
+        nodes = [node for row in self.nodes for node in row]
+        symbols = ["S" if node.initial else "G" if node.goal else "■" if node.blocked else "." for node in nodes]
+        for step, cell, kind in trace:
+            if kind == TRACE_EXPAND:
+                if symbols[cell] in ".o":
+                    symbols[cell] = "x"
+                if step % every == 0:
+                    previous, symbols[cell] = symbols[cell], "@"
+                    self._print_frame(symbols, delay)
+                    symbols[cell] = previous
+            elif symbols[cell] == ".":
+                symbols[cell] = "o"
+        if result is not None:
+            node = result.parent
+            while node is not None and node.parent is not None:
+                symbols[(self.ylim-1-node.coords[1]) * self.xlim + node.coords[0]] = "@"
+                node = node.parent
+        self._print_frame(symbols, 0)
+
+    def _print_frame(self, symbols, delay):
+        """
+        Prints one replay frame given the symbol of every cell.
+        """
+        clear_output(wait=True)
+        print("\n".join(" ".join(symbols[start:start + self.xlim]) for start in range(0, len(symbols), self.xlim)))
+        time.sleep(delay)
+
+def manhattan(node1, node2):
+    """
+    Returns the Manhattan distance between two nodes.
+    """
+    return abs(node1.coords[0] - node2.coords[0]) + abs(node1.coords[1] - node2.coords[1])
+
+def _link_path(path):
+    """
+    Sets the parent, action and path cost of each node on a path given as a list of nodes from the initial node to the goal,
+    so that the path can be followed back from the goal like the results of the other search algorithms.
+    """
+    path[0].parent = None
+    path[0].g = 0
+    for previous, node in zip(path, path[1:]):
+        node.set_parent(previous)
+        node.g = previous.g + 1
+
+def _mark_expanded(grid, node):
+    """
+    Does the expansion bookkeeping of Node.expand for search algorithms that do not call it.
+    """
+    grid.expansions += 1
+    grid._reached.add(node)
+    if grid.trace is not None:
+        grid.trace.record(grid.expansions, (grid.ylim-1-node.coords[1]) * grid.xlim + node.coords[0], TRACE_EXPAND)
+    if grid.search_visualization:
+        node.current = True
+        grid.visualize(grid.search_delay)
+        node.current = False
+
+def _is_free(grid, x, y):
+    """
+    Returns True if (x, y) is within bounds and not blocked.
+    """
+    return 0 <= x < grid.xlim and 0 <= y < grid.ylim and not grid.nodes[grid.ylim-1-y][x].blocked
+
+def _jump(grid, x, y, dx, dy, goal):
+    """
+    Moves from (x, y) in the direction (dx, dy) until a jump point is found.
+    Returns the coordinates of the jump point, or None if the move runs into an obstacle or the grid border.
+    Paths are canonically ordered horizontal-first: a vertical move only stops where a horizontal turn is forced
+    by an obstacle behind it, while a horizontal move stops wherever a vertical move would find a jump point.
+    """
+    while True:
+        x += dx
+        y += dy
+        if not _is_free(grid, x, y):
+            return None
+        if (x, y) == goal:
+            return (x, y)
+        if dx == 0:
+            for side in (-1, 1):
+                if _is_free(grid, x + side, y) and not _is_free(grid, x + side, y - dy):
+                    return (x, y)
+        elif _jump(grid, x, y, 0, 1, goal) is not None or _jump(grid, x, y, 0, -1, goal) is not None:
+            return (x, y)
+
+def _jump_directions(grid, node, parent):
+    """
+    Returns the directions worth exploring from a jump point given the jump point it was reached from.
+    """
+    if parent is None:
+        return [(dx, dy) for dx, dy, _ in DIRECTIONS]
+    x, y = node.coords
+    dx = (x > parent.coords[0]) - (x < parent.coords[0])
+    dy = (y > parent.coords[1]) - (y < parent.coords[1])
+    if dy == 0:
+        return [(dx, 0), (0, 1), (0, -1)]
+    directions = [(0, dy)]
+    for side in (-1, 1):
+        if _is_free(grid, x + side, y) and not _is_free(grid, x + side, y - dy):
+            directions.append((side, 0))
+    return directions
+
+def depth_first_search(grid):
+    """
+    Depth-first search from the initial node, like dfs in the notebook. Used as a baseline by benchmark.
+    Returns the goal node, or None if there is no initial or goal node or the goal is not reachable.
+    """
+    start = grid.get_initial()
+    if start is None or grid.get_goal() is None:
+        return None
+    explored = set()
+    frontier = [start]
+    while frontier:
+        node = frontier.pop()
+        if node.goal_test():
+            return node
+        if node in explored:
+            continue
+        explored.add(node)
+        for successor in node.expand():
+            if successor not in explored:
+                frontier.append(successor)
+    return None
+
+def breadth_first_search(grid):
+    """
+    Breadth-first search from the initial node, like bfs in the notebook. Used as a baseline by benchmark.
+    Returns the goal node, or None if there is no initial or goal node or the goal is not reachable.
+    """
+    start = grid.get_initial()
+    if start is None or grid.get_goal() is None:
+        return None
+    reached = {start}
+    frontier = deque([start])
+    while frontier:
+        node = frontier.popleft()
+        if node.goal_test():
+            return node
+        for successor in node.expand():
+            if successor not in reached:
+                reached.add(successor)
+                frontier.append(successor)
+    return None
+
+def a_star_search(grid):
+    """
+    A* search from the initial node with the Manhattan distance to the goal as heuristic, like a_star in the notebook.
+    Used as a baseline by benchmark.
+    Returns the goal node, or None if there is no initial or goal node or the goal is not reachable.
+    """
+    start, goal = grid.get_initial(), grid.get_goal()
+    if start is None or goal is None:
+        return None
+    explored = set()
+    frontier = PriorityQueue()
+    start.g = 0
+    frontier.push(start, manhattan(start, goal))
+    while not frontier.is_empty():
+        node = frontier.pop()
+        if node.goal_test():
+            return node
+        explored.add(node)
+        for successor in node.expand():
+            if successor not in explored:
+                g_successor = node.g + 1
+                if successor not in frontier or g_successor < successor.g:
+                    successor.g = g_successor
+                    successor.set_parent(node)
+                    frontier.update(successor, g_successor + manhattan(successor, goal))
+    return None
+
+def jump_point_search(grid):
+    """
+    Jump Point Search from the initial node to the goal on the uniform-cost 4-connected grid.
+    Only jump points are expanded and counted in grid.expansions.
+    Returns the goal node with the full parent chain set, or None if the goal is not reachable.
+    """
+    start, goal = grid.get_initial(), grid.get_goal()
+    if start is None or goal is None:
+        return None
+    frontier = PriorityQueue()
+    g = {start: 0}
+    parents = {start: None}
+    closed = set()
+    frontier.push(start, (manhattan(start, goal), manhattan(start, goal)))
+    while not frontier.is_empty():
+        node = frontier.pop()
+        if node is goal:
+            path = []
+            while node is not None:
+                parent = parents[node]
+                path.append(node)
+                if parent is not None: # fill in the cells skipped over by the jump
+                    dx = (parent.coords[0] > node.coords[0]) - (parent.coords[0] < node.coords[0])
+                    dy = (parent.coords[1] > node.coords[1]) - (parent.coords[1] < node.coords[1])
+                    for step in range(1, manhattan(node, parent)):
+                        path.append(grid.get_node((node.coords[0] + dx * step, node.coords[1] + dy * step)))
+                node = parent
+            path.reverse()
+            _link_path(path)
+            return goal
+        closed.add(node)
+        _mark_expanded(grid, node)
+        for dx, dy in _jump_directions(grid, node, parents[node]):
+            coords = _jump(grid, node.coords[0], node.coords[1], dx, dy, goal.coords)
+            if coords is None:
+                continue
+            jump_point = grid.get_node(coords)
+            if jump_point in closed:
+                continue
+            g_new = g[node] + manhattan(node, jump_point)
+            if g_new < g.get(jump_point, g_new + 1):
+                g[jump_point] = g_new
+                parents[jump_point] = node
+                h = manhattan(jump_point, goal)
+                frontier.update(jump_point, (g_new + h, h))
+    return None
+
+def bidirectional_a_star(grid):
+    """
+    Bidirectional A* search: one A* runs forward from the initial node and another backward from the goal,
+    always expanding the side with the smaller frontier. The search stops once the best path through a node
+    reached from both sides is no longer than the lowest f value on either frontier.
+    Returns the goal node with the full parent chain set, or None if the goal is not reachable.
+    """
+    start, goal = grid.get_initial(), grid.get_goal()
+    if start is None or goal is None:
+        return None
+    targets = (goal, start)
+    g = ({start: 0}, {goal: 0})
+    parents = ({start: None}, {goal: None})
+    closed = (set(), set())
+    frontiers = (PriorityQueue(), PriorityQueue())
+    frontiers[0].update(start, (manhattan(start, goal), manhattan(start, goal)))
+    frontiers[1].update(goal, (manhattan(goal, start), manhattan(goal, start)))
+    best = 0 if start is goal else float("inf")
+    meeting = start
+    while not frontiers[0].is_empty() and not frontiers[1].is_empty():
+        if min(frontiers[side].priority(frontiers[side].read())[0] for side in (0, 1)) >= best:
+            break
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        other = 1 - side
+        node = frontiers[side].pop()
+        closed[side].add(node)
+        _mark_expanded(grid, node)
+        g_new = g[side][node] + 1
+        for dx, dy, _ in DIRECTIONS:
+            neighbor = grid.get_node((node.coords[0] + dx, node.coords[1] + dy))
+            if neighbor is None or neighbor.blocked or neighbor in closed[side]:
+                continue
+            if g_new < g[side].get(neighbor, g_new + 1):
+                g[side][neighbor] = g_new
+                parents[side][neighbor] = node
+                h = manhattan(neighbor, targets[side])
+                frontiers[side].update(neighbor, (g_new + h, h))
+                if neighbor in g[other] and g_new + g[other][neighbor] < best:
+                    best = g_new + g[other][neighbor]
+                    meeting = neighbor
+    if best == float("inf"):
+        return None
+    path = []
+    node = meeting
+    while node is not None:
+        path.append(node)
+        node = parents[0][node]
+    path.reverse()
+    node = parents[1][meeting]
+    while node is not None:
+        path.append(node)
+        node = parents[1][node]
+    _link_path(path)
+    return goal
+
+class PathPlanner:
+    """
+    Answers many start/goal path queries on the same static grid.
+    Distance fields (exact distances to a goal computed with a reverse breadth-first search) are cached per goal
+    with LRU eviction, so repeated queries to the same goal only walk down the field along the path.
+    Other queries run A* with an ALT heuristic: precomputed distances from a few landmark cells give lower bounds
+    through the triangle inequality that are never looser than the Manhattan distance.
+    The grid is snapshotted when the planner is created; create a new planner after changing the grid.
+    """
+    def __init__(self, grid, cache_size=16, landmarks=4, field_threshold=2):
+        self.grid = grid
+        self.cache_size = cache_size # maximum number of cached distance fields
+        self.field_threshold = field_threshold # number of queries to a goal after which its distance field is built
+        self.expansions = 0 # cells expanded by the last query
+        self._nodes = [node for row in grid.nodes for node in row] # nodes indexed by cell id
+        self._neighbors = [] # unblocked neighbors of each cell in the order up, left, down, right
+        for node in self._nodes:
+            neighbors = []
+            if not node.blocked:
+                for dx, dy, _ in DIRECTIONS:
+                    neighbor = grid.get_node((node.coords[0] + dx, node.coords[1] + dy))
+                    if neighbor is not None and not neighbor.blocked:
+                        neighbors.append(self._cell(neighbor))
+            self._neighbors.append(neighbors)
+        self._fields = OrderedDict() # goal cell id -> distance field, least recently used first
+        self._goal_queries = {} # goal cell id -> number of queries seen
+        self.landmarks = [] # landmark cell ids
+        self._landmark_fields = [] # distance field of each landmark
+        self._select_landmarks(landmarks)
+
+    def _cell(self, node):
+        """
+        Returns the cell id of a node or of (x, y) coordinates.
+        """
+        x, y = node if isinstance(node, tuple) else node.coords
+        return (self.grid.ylim-1-y) * self.grid.xlim + x
+
+    def distance_field(self, goal):
+        """
+        Returns the distance from every cell to the goal cell (-1 if unreachable) using a reverse breadth-first search.
+        """
+        field = array("i", [-1]) * len(self._nodes)
+        field[goal] = 0
+        frontier = deque([goal])
+        neighbors = self._neighbors
+        while frontier:
+            cell = frontier.popleft()
+            distance = field[cell] + 1
+            for neighbor in neighbors[cell]:
+                if field[neighbor] == -1:
+                    field[neighbor] = distance
+                    frontier.append(neighbor)
+        return field
+
+    def _select_landmarks(self, count):
+        """
+        Picks landmarks with farthest-point selection: each new landmark is the reachable cell farthest from the previous ones.
+        """
+        initial = self.grid.get_initial()
+        free = [cell for cell, node in enumerate(self._nodes) if not node.blocked]
+        if not free or count <= 0:
+            return
+        seed = self._cell(initial) if initial is not None and not initial.blocked else free[0]
+        closest = self.distance_field(seed) # distance to the closest landmark so far
+        for _ in range(count):
+            landmark = max(free, key=lambda cell: closest[cell])
+            if closest[landmark] <= 0:
+                break
+            field = self.distance_field(landmark)
+            self.landmarks.append(landmark)
+            self._landmark_fields.append(field)
+            closest = array("i", (min(a, b) if b != -1 else a for a, b in zip(closest, field)))
+
+    def _get_field(self, goal, build):
+        """
+        Returns the cached distance field of the goal, building it if requested. Returns None otherwise.
+        """
+        field = self._fields.get(goal)
+        if field is not None:
+            self._fields.move_to_end(goal)
+        elif build:
+            field = self.distance_field(goal)
+            self._fields[goal] = field
+            if len(self._fields) > self.cache_size:
+                self._fields.popitem(last=False)
+        return field
+
+    def heuristic(self, cell, goal):
+        """
+        Returns the ALT lower bound on the distance between two cells, which is at least their Manhattan distance.
+        """
+        xlim = self.grid.xlim
+        h = abs(cell % xlim - goal % xlim) + abs(cell // xlim - goal // xlim)
+        for field in self._landmark_fields:
+            if field[cell] != -1 and field[goal] != -1:
+                h = max(h, abs(field[goal] - field[cell]))
+        return h
+
+    def plan(self, start, goal):
+        """
+        Returns the shortest path from start to goal as a list of nodes, or None if the goal is not reachable.
+        start and goal can be nodes or (x, y) coordinates. The nodes of the grid are not modified.
+        """
+        start, goal = self._cell(start), self._cell(goal)
+        self._goal_queries[goal] = self._goal_queries.get(goal, 0) + 1
+        field = self._get_field(goal, self._goal_queries[goal] >= self.field_threshold)
+        path = self._descend(start, goal, field) if field is not None else self._a_star(start, goal)
+        return None if path is None else [self._nodes[cell] for cell in path]
+
+    def plan_many(self, pairs):
+        """
+        Answers a batch of (start, goal) queries and returns the paths in the same order.
+        Queries are grouped by goal, and a distance field is built for every goal with at least field_threshold queries.
+        """
+        pairs = [(self._cell(start), self._cell(goal)) for start, goal in pairs]
+        counts = {}
+        for _, goal in pairs:
+            counts[goal] = counts.get(goal, 0) + 1
+        paths = [None] * len(pairs)
+        for i in sorted(range(len(pairs)), key=lambda i: pairs[i][1]):
+            start, goal = pairs[i]
+            field = self._get_field(goal, counts[goal] >= self.field_threshold)
+            path = self._descend(start, goal, field) if field is not None else self._a_star(start, goal)
+            paths[i] = None if path is None else [self._nodes[cell] for cell in path]
+        return paths
+
+    def _descend(self, start, goal, field):
+        """
+        Follows a distance field downhill from start to goal. Runs in O(path length).
+        """
+        self.expansions = 0
+        if field[start] == -1 or self._nodes[start].blocked:
+            return None
+        path = [start]
+        cell = start
+        while cell != goal:
+            self.expansions += 1
+            distance = field[cell] - 1
+            cell = next(neighbor for neighbor in self._neighbors[cell] if field[neighbor] == distance)
+            path.append(cell)
+        return path
+
+    def _a_star(self, start, goal):
+        """
+        A* search between two cells with the ALT heuristic.
+        """
+        self.expansions = 0
+        if self._nodes[start].blocked or self._nodes[goal].blocked:
+            return None
+        for field in self._landmark_fields: # cells in different connected components can be rejected at once
+            if (field[start] == -1) != (field[goal] == -1):
+                return None
+        g = {start: 0}
+        parents = {start: None}
+        closed = set()
+        frontier = PriorityQueue()
+        h = self.heuristic(start, goal)
+        frontier.push(start, (h, h))
+        while not frontier.is_empty():
+            cell = frontier.pop()
+            if cell == goal:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = parents[cell]
+                path.reverse()
+                return path
+            closed.add(cell)
+            self.expansions += 1
+            g_new = g[cell] + 1
+            for neighbor in self._neighbors[cell]:
+                if neighbor not in closed and g_new < g.get(neighbor, g_new + 1):
+                    g[neighbor] = g_new
+                    parents[neighbor] = cell
+                    h = self.heuristic(neighbor, goal)
+                    frontier.update(neighbor, (g_new + h, h))
+        return None
+
+class IncrementalPlanner:
+    """
+    Incremental path planner based on D* Lite.
+    The planner searches backward from the goal and keeps its g and rhs values between plans, so when cells become
+    blocked or unblocked (set_blocked) or the start moves (move_start), the next plan only repairs the part of the
+    search tree affected by the change instead of searching from scratch.
+    """
+    def __init__(self, grid, start=None, goal=None):
+        self.grid = grid
+        self.start = start if start is not None else grid.get_initial()
+        self.goal = goal if goal is not None else grid.get_goal()
+        self.expansions = 0 # nodes expanded by the last plan
+        self._g = {}
+        self._rhs = {self.goal: 0}
+        self._km = 0 # key modifier accumulated from start moves
+        self._last_start = self.start
+        self._frontier = PriorityQueue()
+        self._frontier.update(self.goal, self._key(self.goal))
+
+    def _key(self, node):
+        g = min(self._g.get(node, INF), self._rhs.get(node, INF))
+        return (g + manhattan(self.start, node) + self._km, g)
+
+    def _neighbors(self, node):
+        for dx, dy, _ in DIRECTIONS:
+            neighbor = self.grid.get_node((node.coords[0] + dx, node.coords[1] + dy))
+            if neighbor is not None:
+                yield neighbor
+
+    def _update(self, node):
+        """
+        Recomputes the rhs value of a node and puts it in the frontier if it is locally inconsistent.
+        """
+        if node is not self.goal:
+            rhs = INF
+            if not node.blocked:
+                for neighbor in self._neighbors(node):
+                    if not neighbor.blocked:
+                        rhs = min(rhs, self._g.get(neighbor, INF) + 1)
+            self._rhs[node] = rhs
+        if self._g.get(node, INF) != self._rhs.get(node, INF):
+            self._frontier.update(node, self._key(node), decrease_only=False)
+        else:
+            self._frontier.remove(node)
+
+    def _compute_shortest_path(self):
+        g, rhs, frontier = self._g, self._rhs, self._frontier
+        while not frontier.is_empty():
+            node = frontier.read()
+            old_key = frontier.priority(node)
+            if old_key >= self._key(self.start) and rhs.get(self.start, INF) == g.get(self.start, INF):
+                break
+            new_key = self._key(node)
+            if old_key < new_key:
+                frontier.update(node, new_key, decrease_only=False)
+                continue
+            frontier.pop()
+            self.expansions += 1
+            _mark_expanded(self.grid, node)
+            if g.get(node, INF) > rhs.get(node, INF):
+                g[node] = rhs[node]
+                for neighbor in self._neighbors(node):
+                    self._update(neighbor)
+            else:
+                g[node] = INF
+                self._update(node)
+                for neighbor in self._neighbors(node):
+                    self._update(neighbor)
+
+    def set_blocked(self, coords, value):
+        """
+        Blocks or unblocks the node at the given coordinates and marks the affected nodes for repair.
+        """
+        node = self.grid.get_node(coords)
+        if node is None:
+            raise ValueError(f"Coordinates {coords} are out of bounds.")
+        if node.blocked == value:
+            return
+        self.grid.set_blocked(coords, value)
+        self._update(node)
+        for neighbor in self._neighbors(node):
+            self._update(neighbor)
+
+    def move_start(self, coords):
+        """
+        Moves the start of the path to the node at the given coordinates, e.g. as the agent follows the path.
+        """
+        node = self.grid.get_node(coords)
+        if node is None:
+            raise ValueError(f"Coordinates {coords} are out of bounds.")
+        self.start = node
+        self._km += manhattan(self._last_start, node)
+        self._last_start = node
+
+    def plan(self):
+        """
+        Repairs the search tree after the changes since the last plan and returns the goal node
+        with the parent chain set from the start, or None if the goal is not reachable.
+        """
+        self.expansions = 0
+        self._compute_shortest_path()
+        if self._g.get(self.start, INF) == INF or self.start.blocked:
+            return None
+        path = [self.start]
+        node = self.start
+        while node is not self.goal:
+            node = min((neighbor for neighbor in self._neighbors(node) if not neighbor.blocked), key=lambda neighbor: self._g.get(neighbor, INF))
+            path.append(node)
+        _link_path(path)
+        return self.goal
+
+def benchmark(strategies=None, sizes=((40, 21), (100, 100)), densities=(0.1, 0.3), maps=3, seed=0, csv_path=None):
+    """
+    Compares search strategies on seeded random grids (see Grid.generate_random_nodes).
+    strategies maps names to functions that take a grid and return the goal node (like dfs, bfs and a_star in the notebook).
+    By default the dfs, bfs and A* baselines are compared with jump_point_search and bidirectional_a_star.
+    Each strategy runs headless on every map: once timed and once under tracemalloc to measure its peak memory.
+    Reports wall time, expansions, peak memory, path length and the optimality gap relative to the shortest path,
+    prints the results as a table, writes them to csv_path if given and returns them as a list of dictionaries.
+    """
+    if strategies is None:
+        strategies = {"dfs": depth_first_search, "bfs": breadth_first_search, "a_star": a_star_search,
+                      "jump_point_search": jump_point_search, "bidirectional_a_star": bidirectional_a_star}
+    rows = []
+    for xlim, ylim in sizes:
+        for density in densities:
+            for map_index in range(maps):
+                grid = Grid(xlim, ylim)
+                # random.Random hashes str seeds with SHA-512, so the maps are the same on every run and Python build
+                grid.generate_random_nodes(density, seed=f"{seed}-{xlim}x{ylim}-{density}-{map_index}")
+                reference = CompactGrid.from_grid(grid)
+                goal = reference.bfs()
+                optimal = reference.g[goal] if goal is not None else None
+                for name, strategy in strategies.items():
+                    row = {"strategy": name, "width": xlim, "height": ylim, "density": density, "map": map_index}
+                    row.update(_run_strategy(grid, strategy, optimal))
+                    rows.append(row)
+    _print_table(rows)
+    if csv_path is not None:
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
+
+def _run_strategy(grid, strategy, optimal):
+    """
+    Runs one strategy headless on the grid and returns its measurements.
+    """
+    visualization, trace = grid.search_visualization, grid.trace
+    grid.search_visualization, grid.trace = False, None
+    try:
+        grid.reset()
+        start = time.perf_counter()
+        result = strategy(grid)
+        elapsed = time.perf_counter() - start
+        expansions = grid.expansions
+        grid.reset()
+        tracemalloc.start()
+        strategy(grid)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        grid.search_visualization, grid.trace = visualization, trace
+    length = None
+    if result is not None:
+        length = 0
+        node = result
+        while node.parent is not None:
+            length += 1
+            node = node.parent
+    if length is None or optimal is None:
+        gap = None if length != optimal else 0.0
+    else:
+        gap = (length - optimal) / optimal if optimal else 0.0
+    return {
+        "time_ms": round(elapsed * 1000, 3),
+        "expansions": expansions,
+        "peak_kib": round(peak / 1024, 1),
+        "path_length": length,
+        "optimal_length": optimal,
+        "gap": None if gap is None else round(gap, 4),
+    }
+
+def _print_table(rows):
+    """
+    Prints a list of dictionaries with the same keys as an aligned table.
+    """
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    cells = [[str(row[column]) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(row[i]) for row in cells)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+class CompactGrid:
+    """
+    A compact, array-backed alternative to Grid for searching very large maps.
+    Cells are identified by integer ids in the same row-major layout as Grid.nodes (top row first),
+    so cell id = (ylim-1-y) * xlim + x for coordinates (x, y).
+    Cell properties are stored as bit flags (BLOCKED, GOAL, INITIAL) in a flat byte buffer,
+    and the search state (parent, g, h) lives in parallel arrays instead of Node objects.
+    The search state of a cell is only valid if its stamp is at least the current epoch (epoch for reached cells,
+    epoch + 1 for closed ones), so resetting the grid only advances the epoch.
+    """
+    def __init__(self, xlim, ylim, flags=None, initial=-1, goal=-1):
+        self.xlim = xlim
+        self.ylim = ylim
+        self.size = xlim * ylim
+        self.flags = flags if flags is not None else bytearray(self.size) # one byte of flags per cell
+        self.offsets = (-xlim, -1, xlim, 1) # cell id offsets for moving up, left, down and right
+        self.adjacency_start = None # CSR row pointers: successors of cell i are adjacency[adjacency_start[i]:adjacency_start[i+1]]
+        self.adjacency = None # CSR column indices
+        self.initial = initial # id of the initial cell
+        self.goal = goal # id of the goal cell
+        self.parent = array("i", [-1]) * self.size # parent cell id, -1 if none
+        self.g = array("i", [0]) * self.size # path cost
+        self.h = array("i", [0]) * self.size # heuristic value
+        self.stamp = array("I", [0]) * self.size # epoch in which the cell was reached, plus one once it is closed
+        self.epoch = 2 # search generation, always even
+        self.expansions = 0
+
+    @classmethod
+    def from_grid(cls, grid):
+        """
+        Builds a CompactGrid with the same layout as the given Grid.
+        """
+        flags = bytearray(grid.xlim * grid.ylim)
+        initial = goal = -1
+        cell = 0
+        for row in grid.nodes:
+            for node in row:
+                flags[cell] = (BLOCKED if node.blocked else 0) | (GOAL if node.goal else 0) | (INITIAL if node.initial else 0)
+                if node.initial and initial == -1:
+                    initial = cell
+                if node.goal and goal == -1:
+                    goal = cell
+                cell += 1
+        return cls(grid.xlim, grid.ylim, flags, initial, goal)
+
+    @classmethod
+    def load_map(cls, path):
+        """
+        Builds a CompactGrid from a plain-text map file (see read_map for the format).
+        """
+        return cls(*read_map(path))
+
+    @classmethod
+    def load_binary_map(cls, path):
+        """
+        Builds a CompactGrid from a binary occupancy map written by save_binary_map.
+        The cell flags are memory-mapped copy-on-write, so loading is constant time regardless of the map size
+        and changes made to the grid are never written back to the file.
+        """
+        with open(path, "rb") as f:
+            header = f.read(BINARY_MAP_HEADER.size)
+            if len(header) < BINARY_MAP_HEADER.size:
+                raise ValueError(f"{path} is too short for a binary map header: {len(header)} of {BINARY_MAP_HEADER.size} bytes")
+            magic, xlim, ylim, initial, goal = BINARY_MAP_HEADER.unpack(header)
+            if magic != BINARY_MAP_MAGIC:
+                raise ValueError(f"{path} is not a binary map file")
+            size = os.fstat(f.fileno()).st_size - BINARY_MAP_HEADER.size
+            if size != xlim * ylim:
+                raise ValueError(f"{path} has {size} bytes of cell data, expected {xlim * ylim} for a {xlim}x{ylim} map")
+            for name, cell in (("initial", initial), ("goal", goal)):
+                if not -1 <= cell < size:
+                    raise ValueError(f"{path} has an invalid {name} cell id {cell} for a {xlim}x{ylim} map")
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        flags = memoryview(buffer)[BINARY_MAP_HEADER.size:]
+        return cls(xlim, ylim, flags, initial, goal)
+
+    def save_map(self, path):
+        """
+        Writes the grid as a plain-text map file (see read_map for the format).
+        """
+        with open(path, "wb") as f:
+            for start in range(0, self.size, self.xlim):
+                f.write(bytes(self.flags[start:start + self.xlim]).translate(_FLAGS_TO_MAP) + b"\n")
+
+    def save_binary_map(self, path):
+        """
+        Writes the grid as a binary occupancy map: a fixed header with the grid size and the initial and goal cell ids,
+        followed by one byte of flags per cell.
+        """
+        with open(path, "wb") as f:
+            f.write(BINARY_MAP_HEADER.pack(BINARY_MAP_MAGIC, self.xlim, self.ylim, self.initial, self.goal))
+            f.write(self.flags)
+
+    def cell_id(self, coords):
+        """
+        Returns the cell id of the given (x, y) coordinates.
+        """
+        return (self.ylim-1-coords[1]) * self.xlim + coords[0]
+
+    def coords(self, cell):
+        """
+        Returns the (x, y) coordinates of the given cell id.
+        """
+        row, x = divmod(cell, self.xlim)
+        return (x, self.ylim-1-row)
+
+    def build_adjacency(self):
+        """
+        Precomputes the successors of every cell in CSR form.
+        Blocked cells have no successors and are never listed as successors.
+        """
+        xlim, flags = self.xlim, self.flags
+        last_row = self.size - xlim
+        start = array("i", [0]) * (self.size + 1)
+        adjacency = array("i")
+        for cell in range(self.size):
+            if not flags[cell] & BLOCKED:
+                x = cell % xlim
+                if cell >= xlim and not flags[cell - xlim] & BLOCKED:
+                    adjacency.append(cell - xlim)
+                if x > 0 and not flags[cell - 1] & BLOCKED:
+                    adjacency.append(cell - 1)
+                if cell < last_row and not flags[cell + xlim] & BLOCKED:
+                    adjacency.append(cell + xlim)
+                if x < xlim - 1 and not flags[cell + 1] & BLOCKED:
+                    adjacency.append(cell + 1)
+            start[cell + 1] = len(adjacency)
+        self.adjacency_start = start
+        self.adjacency = adjacency
+
+    def successors(self, cell):
+        """
+        Returns the ids of the unblocked neighbors of the given cell in the order up, left, down, right.
+        """
+        if self.adjacency is not None:
+            return self.adjacency[self.adjacency_start[cell]:self.adjacency_start[cell + 1]]
+        xlim, flags = self.xlim, self.flags
+        x = cell % xlim
+        result = []
+        for offset in self.offsets:
+            new_cell = cell + offset
+            if 0 <= new_cell < self.size and (offset == xlim or offset == -xlim or new_cell // xlim == cell // xlim) and not flags[new_cell] & BLOCKED:
+                result.append(new_cell)
+        return result
+
+    def expand(self, cell):
+        """
+        Expands the given cell and returns the ids of its successors.
+        """
+        self.expansions += 1
+        return self.successors(cell)
+
+    def manhattan(self, cell1, cell2):
+        """
+        Returns the Manhattan distance between two cells.
+        """
+        row1, x1 = divmod(cell1, self.xlim)
+        row2, x2 = divmod(cell2, self.xlim)
+        return abs(x1 - x2) + abs(row1 - row2)
+
+    def path(self, cell):
+        """
+        Returns the list of coordinates from the initial cell to the given cell by following the parent array.
+        """
+        path = []
+        while cell != -1:
+            path.append(self.coords(cell))
+            cell = self.parent[cell]
+        path.reverse()
+        return path
+
+    def reached(self, cell):
+        """
+        Returns True if the cell has been reached during the current search.
+        """
+        return self.stamp[cell] >= self.epoch
+
+    def reset(self):
+        """
+        Resets the search state and the expansion count in constant time by advancing the epoch.
+        """
+        self.epoch += 2
+        if self.epoch >= 2**32 - 2: # the stamps would overflow, so clear them for real
+            self.stamp = array("I", [0]) * self.size
+            self.epoch = 2
+        self.expansions = 0
+
+    def dfs(self):
+        """
+        Depth-first search from the initial cell.
+        Returns the goal cell id, or None if the map has no initial or goal cell or the goal is not reachable.
+        """
+        if self.initial == -1 or self.goal == -1:
+            return None
+        parent, stamp, flags, epoch = self.parent, self.stamp, self.flags, self.epoch
+        frontier = [self.initial]
+        stamp[self.initial] = epoch
+        parent[self.initial] = -1
+        while frontier:
+            cell = frontier.pop()
+            if flags[cell] & GOAL:
+                return cell
+            for successor in self.expand(cell):
+                if stamp[successor] < epoch:
+                    stamp[successor] = epoch
+                    parent[successor] = cell
+                    frontier.append(successor)
+        return None
+
+    def bfs(self):
+        """
+        Breadth-first search from the initial cell.
+        Returns the goal cell id, or None if the map has no initial or goal cell or the goal is not reachable.
+        """
+        if self.initial == -1 or self.goal == -1:
+            return None
+        parent, stamp, flags, g, epoch = self.parent, self.stamp, self.flags, self.g, self.epoch
+        frontier = deque([self.initial])
+        stamp[self.initial] = epoch
+        parent[self.initial] = -1
+        g[self.initial] = 0
+        while frontier:
+            cell = frontier.popleft()
+            if flags[cell] & GOAL:
+                return cell
+            for successor in self.expand(cell):
+                if stamp[successor] < epoch:
+                    stamp[successor] = epoch
+                    parent[successor] = cell
+                    g[successor] = g[cell] + 1
+                    frontier.append(successor)
+        return None
+
+    def a_star(self):
+        """
+        A* search from the initial cell with the Manhattan distance to the goal as heuristic.
+        Ties in f are broken in favor of the lower heuristic value, i.e. the deeper cell.
+        Returns the goal cell id, or None if the map has no initial or goal cell or the goal is not reachable.
+        """
+        if self.initial == -1 or self.goal == -1:
+            return None
+        parent, stamp, g, h, epoch = self.parent, self.stamp, self.g, self.h, self.epoch
+        goal = self.goal
+        frontier = PriorityQueue()
+        stamp[self.initial] = epoch
+        parent[self.initial] = -1
+        g[self.initial] = 0
+        h[self.initial] = self.manhattan(self.initial, goal)
+        frontier.push(self.initial, (h[self.initial], h[self.initial]))
+        while not frontier.is_empty():
+            cell = frontier.pop()
+            if cell == goal:
+                return cell
+            stamp[cell] = epoch + 1 # closed
+            g_successor = g[cell] + 1
+            for successor in self.expand(cell):
+                if stamp[successor] > epoch:
+                    continue
+                if stamp[successor] < epoch:
+                    stamp[successor] = epoch
+                    h[successor] = self.manhattan(successor, goal)
+                elif g_successor >= g[successor]:
+                    continue
+                g[successor] = g_successor
+                parent[successor] = cell
+                frontier.update(successor, (g_successor + h[successor], h[successor]))
+        return None
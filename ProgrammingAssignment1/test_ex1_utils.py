@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+from ex1_utils import CompactGrid, Grid, PriorityQueue, benchmark, manhattan
+
+NOTEBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ex1.ipynb")
+
+# Map on which A* first reaches the cell next to the goal through a longer path and later finds a cheaper one
+DETOUR_MAP = [
+    "...#.....##G",
+    "##...#.#.#..",
+    "#.#S#.......",
+    "..#....#....",
+    "#.##..##.##.",
+    ".....####...",
+    ".##.......#.",
+    "##....##..#.",
+]
+
+def notebook_search(name):
+    """
+    Returns the search function with the given name defined in the notebook, without running the rest of its cell.
+    """
+    with open(NOTEBOOK, encoding="utf-8") as f:
+        cells = json.load(f)["cells"]
+    source = next("".join(cell["source"]) for cell in cells if "".join(cell["source"]).startswith(f"def {name}("))
+    namespace = {"PriorityQueue": PriorityQueue, "manhattan": manhattan}
+    exec(source[:source.index("\n\n#")], namespace)
+    return namespace[name]
+
+def write_map(path, rows):
+    path.write_text("\n".join(rows) + "\n")
+    return path
+
+@pytest.mark.parametrize("rows", [["S..#", "...."], ["...#", "...G"]])
+def test_compact_grid_search_without_initial_or_goal(tmp_path, rows):
+    grid = CompactGrid.load_map(write_map(tmp_path / "map.txt", rows))
+    for search in (grid.dfs, grid.bfs, grid.a_star):
+        grid.reset()
+        assert search() is None
+
+def test_notebook_a_star_relinks_cheaper_paths(tmp_path):
+    path = write_map(tmp_path / "map.txt", DETOUR_MAP)
+    compact = CompactGrid.load_map(path)
+    shortest = compact.g[compact.bfs()]
+    grid = Grid(compact.xlim, compact.ylim)
+    grid.load_map(path)
+    grid.reset()
+    node = notebook_search("a_star")(grid)
+    steps = 0
+    while node.parent is not None:
+        assert manhattan(node, node.parent) == 1
+        node = node.parent
+        steps += 1
+    assert node.initial
+    assert steps == shortest
+
+def test_benchmark_compares_baselines_on_seeded_maps(capsys):
+    rows = benchmark(sizes=((20, 12),), densities=(0.3,), maps=2)
+    assert {row["strategy"] for row in rows} >= {"dfs", "bfs", "a_star"}
+    assert all(row["gap"] in (0.0, None) for row in rows if row["strategy"] != "dfs")
+    again = benchmark(sizes=((20, 12),), densities=(0.3,), maps=2)
+    assert [row["path_length"] for row in rows] == [row["path_length"] for row in again]
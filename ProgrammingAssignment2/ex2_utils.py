@@ -0,0 +1,685 @@
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from sklearn.neighbors import KDTree
+import json
+import math
+import os
+import random
+import time
+import numpy as np
+
+MOVE_KINDS = ("swap", "2opt", "oropt") # supported neighborhood moves
+OR_OPT_LENGTHS = (1, 2, 3) # lengths of the segments moved by or-opt
+CANDIDATE_KINDS = ("2opt", "oropt") # moves supported by CandidateTour
+MULTI_START_METHODS = ("hill_climbing", "simulated_annealing") # TourEngine searches that multi_start can run
+COOLING_SCHEDULES = ("linear", "exponential", "adaptive") # cooling schedules supported by Annealer
+
+class TourEngine:
+    """
+    Scores and applies local search moves on orderings of sites without building neighbor lists.
+    An ordering is represented as a list of site indices whose first and last entries stay fixed, as in the notebook.
+    Distances are precomputed into a NumPy matrix, and every move is scored by the O(1) change it makes to the total distance.
+    Moves are tuples:
+        ("swap", i, j)      swaps the sites at positions i < j
+        ("2opt", i, j)      reverses the sites at positions i..j
+        ("oropt", i, L, k)  moves the L sites starting at position i so that they follow the site at position k
+    """
+    def __init__(self, sites, dist=None):
+        self.sites = list(sites)
+        self.n = len(self.sites)
+        self.coords = np.asarray(self.sites, dtype=float)
+        if dist is None:
+            difference = self.coords[:, None, :] - self.coords[None, :, :]
+            dist = np.sqrt((difference ** 2).sum(axis=2))
+        self.dist = dist # dist[a, b] is the distance between sites a and b
+
+    def indices(self, ordering):
+        """
+        Converts an ordering of sites (as used in the notebook) to an ordering of site indices.
+        Duplicate sites are matched to their indices in order of appearance.
+        """
+        positions = {}
+        for index, site in enumerate(self.sites):
+            positions.setdefault(site, []).append(index)
+        used = {}
+        order = []
+        for site in ordering:
+            count = used.get(site, 0)
+            order.append(positions[site][count])
+            used[site] = count + 1
+        return order
+
+    def ordering(self, order):
+        """
+        Converts an ordering of site indices back to an ordering of sites.
+        """
+        return [self.sites[index] for index in order]
+
+    def length(self, order):
+        """
+        Returns the total distance traveled by visiting the sites in the given order.
+        """
+        order = np.asarray(order)
+        return float(self.dist[order[:-1], order[1:]].sum())
+
+    def evaluate(self, order):
+        """
+        Returns the total distance rounded to an integer, like evaluate in the notebook.
+        """
+        return round(self.length(order))
+
+    def random_order(self, rng=random):
+        """
+        Returns a random ordering of all sites that keeps the first and last sites fixed.
+        """
+        middle = list(range(1, self.n - 1))
+        rng.shuffle(middle)
+        return [0] + middle + [self.n - 1]
+
+    def delta(self, order, move):
+        """
+        Returns the change in total distance caused by applying the move to the order, in O(1).
+        """
+        d = self.dist
+        kind = move[0]
+        if kind == "swap":
+            _, i, j = move
+            a, b, c = order[i - 1], order[i], order[i + 1]
+            x, y, z = order[j - 1], order[j], order[j + 1]
+            if j == i + 1:
+                return d[a, y] + d[b, z] - d[a, b] - d[y, z]
+            return d[a, y] + d[y, c] + d[x, b] + d[b, z] - d[a, b] - d[b, c] - d[x, y] - d[y, z]
+        if kind == "2opt":
+            _, i, j = move
+            a, b = order[i - 1], order[i]
+            c, e = order[j], order[j + 1]
+            return d[a, c] + d[b, e] - d[a, b] - d[c, e]
+        if kind == "oropt":
+            _, i, length, k = move
+            previous, first, last, following = order[i - 1], order[i], order[i + length - 1], order[i + length]
+            before, after = order[k], order[k + 1]
+            removed = d[previous, first] + d[last, following] - d[previous, following]
+            inserted = d[before, first] + d[last, after] - d[before, after]
+            return inserted - removed
+        raise ValueError(f"Invalid move: {move}. Use one of {MOVE_KINDS}.")
+
+    def apply(self, order, move):
+        """
+        Applies the move to the order in place and returns the order.
+        """
+        kind = move[0]
+        if kind == "swap":
+            _, i, j = move
+            order[i], order[j] = order[j], order[i]
+        elif kind == "2opt":
+            _, i, j = move
+            order[i:j + 1] = order[i:j + 1][::-1]
+        elif kind == "oropt":
+            _, i, length, k = move
+            segment = order[i:i + length]
+            del order[i:i + length]
+            position = k + 1 if k < i else k - length + 1
+            order[position:position] = segment
+        else:
+            raise ValueError(f"Invalid move: {move}. Use one of {MOVE_KINDS}.")
+        return order
+
+    def moves(self, kinds=MOVE_KINDS):
+        """
+        Lazily generates every move of the given kinds.
+        """
+        last = self.n - 2 # last movable position
+        if "swap" in kinds:
+            for i in range(1, last + 1):
+                for j in range(i + 1, last + 1):
+                    yield ("swap", i, j)
+        if "2opt" in kinds:
+            for i in range(1, last + 1):
+                for j in range(i + 1, last + 1):
+                    yield ("2opt", i, j)
+        if "oropt" in kinds:
+            for length in OR_OPT_LENGTHS:
+                for i in range(1, last - length + 2):
+                    for k in range(0, last + 1):
+                        if not i - 1 <= k <= i + length - 1:
+                            yield ("oropt", i, length, k)
+
+    def random_move(self, rng=random, kinds=MOVE_KINDS):
+        """
+        Draws a random move of the given kinds in O(1).
+        """
+        last = self.n - 2
+        kind = rng.choice(kinds)
+        if kind == "oropt":
+            length = rng.choice([length for length in OR_OPT_LENGTHS if length <= last - 1] or [1])
+            i = rng.randint(1, last - length + 1)
+            k = rng.randint(0, last - length - 1) # skip over the positions that would leave the order unchanged
+            if k >= i - 1:
+                k += length + 1
+            return ("oropt", i, length, k)
+        i, j = rng.sample(range(1, last + 1), 2)
+        return (kind, min(i, j), max(i, j))
+
+    def best_move(self, order, kinds=MOVE_KINDS, start=None):
+        """
+        Returns the move with the lowest delta and the delta, or (None, inf) if no move exists.
+        All moves of a kind are scored at once with NumPy broadcasting.
+        If start is given, only the moves beginning at that position (i for swap and 2-opt, the segment start for or-opt)
+        are scored, which takes O(n) instead of O(n^2).
+        """
+        d = self.dist
+        o = np.asarray(order)
+        last = self.n - 2
+        best, best_delta = None, math.inf
+        if last < 2:
+            return best, best_delta
+        positions = np.arange(1, last + 1)
+        rows = positions if start is None else np.array([start])
+        upper = positions[None, :] > rows[:, None] # valid (i, j) pairs with i < j
+        if "2opt" in kinds:
+            a, b = o[rows - 1], o[rows]
+            c, e = o[positions], o[positions + 1]
+            deltas = d[a[:, None], c[None, :]] + d[b[:, None], e[None, :]] - d[a, b][:, None] - d[c, e][None, :]
+            deltas = np.where(upper, deltas, math.inf)
+            i, j = np.unravel_index(np.argmin(deltas), deltas.shape)
+            if deltas[i, j] < best_delta:
+                best, best_delta = ("2opt", int(rows[i]), int(positions[j])), float(deltas[i, j])
+        if "swap" in kinds:
+            a, b, c = o[rows - 1], o[rows], o[rows + 1]
+            x, y, z = o[positions - 1], o[positions], o[positions + 1]
+            deltas = (d[a[:, None], y[None, :]] + d[y[None, :], c[:, None]] + d[x[None, :], b[:, None]] + d[b[:, None], z[None, :]]
+                      - (d[a, b] + d[b, c])[:, None] - (d[x, y] + d[y, z])[None, :])
+            following = np.minimum(rows + 1, last) # swaps with the next site only change two edges
+            adjacent = d[a, o[following]] + d[b, o[following + 1]] - d[a, b] - d[o[following], o[following + 1]]
+            deltas = np.where(positions[None, :] == rows[:, None] + 1, adjacent[:, None], deltas)
+            deltas = np.where(upper, deltas, math.inf)
+            i, j = np.unravel_index(np.argmin(deltas), deltas.shape)
+            if deltas[i, j] < best_delta:
+                best, best_delta = ("swap", int(rows[i]), int(positions[j])), float(deltas[i, j])
+        if "oropt" in kinds:
+            k = np.arange(0, last + 1)
+            before, after = o[k], o[k + 1]
+            for length in OR_OPT_LENGTHS:
+                starts = np.arange(1, last - length + 2)
+                if start is not None:
+                    starts = starts[starts == start]
+                if len(starts) == 0:
+                    continue
+                first, final = o[starts], o[starts + length - 1]
+                previous, following = o[starts - 1], o[starts + length]
+                removed = d[previous, first] + d[final, following] - d[previous, following]
+                inserted = d[before[None, :], first[:, None]] + d[final[:, None], after[None, :]] - d[before, after][None, :]
+                deltas = inserted - removed[:, None]
+                invalid = (k[None, :] >= starts[:, None] - 1) & (k[None, :] <= starts[:, None] + length - 1)
+                deltas = np.where(invalid, math.inf, deltas)
+                i, kk = np.unravel_index(np.argmin(deltas), deltas.shape)
+                if deltas[i, kk] < best_delta:
+                    best, best_delta = ("oropt", int(starts[i]), length, int(k[kk])), float(deltas[i, kk])
+        return best, best_delta
+
+    def hill_climbing(self, order, kinds=MOVE_KINDS, first_improvement=False):
+        """
+        Hill climbing until no move shortens the path.
+        By default the best move of the whole neighborhood is applied at each step (steepest descent, as in the notebook).
+        With first_improvement, the positions are swept in order and the best move beginning at each position is applied
+        as soon as it improves the path, which scales to thousands of sites.
+        """
+        order = list(order)
+        if not first_improvement:
+            while True:
+                move, delta = self.best_move(order, kinds)
+                if move is None or delta >= -1e-9:
+                    return order
+                self.apply(order, move)
+        improved = True
+        while improved:
+            improved = False
+            for position in range(1, self.n - 1):
+                move, delta = self.best_move(order, kinds, start=position)
+                if move is not None and delta < -1e-9:
+                    self.apply(order, move)
+                    improved = True
+        return order
+
+    def random_restart_hill_climbing(self, iterations, kinds=MOVE_KINDS, first_improvement=False, rng=random):
+        """
+        Runs hill climbing from the given number of random orderings and returns the best result.
+        """
+        best_order, best_length = None, math.inf
+        for _ in range(iterations):
+            order = self.hill_climbing(self.random_order(rng), kinds, first_improvement)
+            length = self.length(order)
+            if length < best_length:
+                best_order, best_length = order, length
+        return best_order
+
+    def simulated_annealing(self, order=None, T=3000, alpha=0.99, kinds=("swap",), rng=random, schedule="linear"):
+        """
+        Simulated annealing, by default with the notebook's linear cooling schedule (T -= alpha while T > 1e-21).
+        Each step draws one random move and accepts it by its cost delta with the Metropolis criterion.
+        Returns the best ordering found. See Annealer for budgets, progress callbacks and checkpoints.
+        """
+        annealer = Annealer(self, order, T=T, schedule=schedule, alpha=alpha, kinds=kinds, rng=rng)
+        return annealer.run()
+
+class Annealer:
+    """
+    Anytime simulated annealing on a TourEngine that can be stopped, checkpointed and resumed.
+    Each iteration draws one random move in O(1) and accepts it by its cost delta, so the neighborhood is never built.
+    Cooling schedules:
+        "linear"       T -= alpha every iteration, as in the notebook
+        "exponential"  T *= alpha every iteration
+        "adaptive"     T *= alpha ** (rate / target_acceptance), where rate is a moving average of the acceptance
+                       rate of uphill moves, so T drops quickly while almost everything is accepted and slowly once
+                       the search starts rejecting moves
+    The search stops when T falls to min_T, like the notebook's loop.
+    """
+    def __init__(self, engine, order=None, T=3000, schedule="linear", alpha=0.99, min_T=1e-21, kinds=("swap",),
+                 target_acceptance=0.3, rng=None):
+        if schedule not in COOLING_SCHEDULES:
+            raise ValueError(f"Invalid schedule: {schedule}. Use one of {COOLING_SCHEDULES}.")
+        self.engine = engine
+        self.rng = rng if rng is not None else random.Random()
+        self.order = list(order) if order is not None else engine.random_order(self.rng)
+        self.length = engine.length(self.order) # length of the current ordering, updated by the move deltas
+        self.best_order = list(self.order)
+        self.best_length = self.length
+        self.T = T
+        self.schedule = schedule
+        self.alpha = alpha
+        self.min_T = min_T
+        self.kinds = tuple(kinds)
+        self.target_acceptance = target_acceptance
+        self.acceptance = 1.0 # moving average of the acceptance rate of uphill moves
+        self.iteration = 0
+
+    def done(self):
+        """
+        Returns True if the temperature has reached min_T.
+        """
+        return self.T <= self.min_T
+
+    def step(self):
+        """
+        Runs one iteration: draws a move, accepts or rejects it and cools down.
+        """
+        move = self.engine.random_move(self.rng, self.kinds)
+        delta = self.engine.delta(self.order, move)
+        if delta < 0:
+            accepted = True
+        else:
+            accepted = self.rng.random() <= math.exp(-delta / self.T)
+            self.acceptance += 0.01 * (accepted - self.acceptance)
+        if accepted:
+            self.engine.apply(self.order, move)
+            self.length += delta
+            if self.length < self.best_length:
+                self.best_order, self.best_length = list(self.order), self.length
+        if self.schedule == "linear":
+            self.T = self.T - self.alpha
+        elif self.schedule == "exponential":
+            self.T = self.T * self.alpha
+        else:
+            self.T = self.T * self.alpha ** max(self.acceptance / self.target_acceptance, 0.1)
+        self.iteration += 1
+
+    def run(self, iterations=None, seconds=None, callback=None, every=1000, checkpoint=None, checkpoint_seconds=60):
+        """
+        Anneals until the temperature reaches min_T or the budget runs out, and returns the best ordering found.
+        iterations and seconds limit this call, so run can be called again to continue.
+        callback(annealer) is called every `every` iterations; if it returns True the run stops.
+        If a checkpoint path is given, the state is saved there every checkpoint_seconds and when the run stops,
+        including when it is interrupted.
+        """
+        start = time.perf_counter()
+        saved = start
+        count = 0
+        try:
+            while not self.done():
+                if iterations is not None and count >= iterations:
+                    break
+                self.step()
+                count += 1
+                if count % every == 0:
+                    now = time.perf_counter()
+                    if callback is not None and callback(self):
+                        break
+                    if seconds is not None and now - start >= seconds:
+                        break
+                    if checkpoint is not None and now - saved >= checkpoint_seconds:
+                        self.save(checkpoint)
+                        saved = now
+        finally:
+            if checkpoint is not None:
+                self.save(checkpoint)
+        return self.best_order
+
+    def save(self, path):
+        """
+        Writes the state of the search (current and best orderings, temperature, schedule and random state) as JSON.
+        The file is replaced atomically, so an interruption while saving keeps the previous checkpoint.
+        """
+        state = {
+            "sites": len(self.engine.sites),
+            "order": self.order,
+            "length": self.length,
+            "best_order": self.best_order,
+            "best_length": self.best_length,
+            "T": self.T,
+            "schedule": self.schedule,
+            "alpha": self.alpha,
+            "min_T": self.min_T,
+            "kinds": self.kinds,
+            "target_acceptance": self.target_acceptance,
+            "acceptance": self.acceptance,
+            "iteration": self.iteration,
+            "rng": self.rng.getstate(),
+        }
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(state, f)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, engine):
+        """
+        Restores a search saved with save. The engine must be built from the same sites.
+        Resuming continues exactly where the saved search stopped.
+        """
+        with open(path, "r") as f:
+            state = json.load(f)
+        if state["sites"] != len(engine.sites):
+            raise ValueError(f"{path} was saved for {state['sites']} sites, not {len(engine.sites)}")
+        version, internal, gauss = state["rng"]
+        rng = random.Random()
+        rng.setstate((version, tuple(internal), gauss))
+        annealer = cls(engine, state["order"], T=state["T"], schedule=state["schedule"], alpha=state["alpha"],
+                       min_T=state["min_T"], kinds=state["kinds"], target_acceptance=state["target_acceptance"], rng=rng)
+        annealer.length = state["length"]
+        annealer.best_order = state["best_order"]
+        annealer.best_length = state["best_length"]
+        annealer.acceptance = state["acceptance"]
+        annealer.iteration = state["iteration"]
+        return annealer
+
+_worker_engine = None # TourEngine of a multi_start worker process
+_worker_memory = None # shared memory holding the distance matrix of that engine
+
+def derive_seeds(seed, runs):
+    """
+    Returns one independent seed per run, derived deterministically from a single seed.
+    """
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(runs)]
+
+def _start_worker(sites, name, shape):
+    """
+    Attaches a worker process to the shared distance matrix.
+    """
+    global _worker_engine, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    dist = np.ndarray(shape, dtype=float, buffer=_worker_memory.buf)
+    dist.flags.writeable = False
+    _worker_engine = TourEngine(sites, dist=dist)
+
+def _run_start(method, seed, options):
+    """
+    Runs one search of a multi_start in a worker process and returns its length and ordering.
+    """
+    engine = _worker_engine
+    rng = random.Random(seed)
+    if method == "hill_climbing":
+        order = engine.hill_climbing(engine.random_order(rng), **options)
+    else:
+        order = engine.simulated_annealing(rng=rng, **options)
+    return engine.length(order), order
+
+def multi_start(sites, runs, method="hill_climbing", seed=0, workers=None, target=None, **options):
+    """
+    Runs independent TourEngine searches from random orderings in a process pool.
+    Every run gets its own seed derived from seed, so the results do not depend on the number of workers.
+    The distance matrix is computed once and shared read-only with the workers.
+    Yields (run, length, best_order, best_length) as each run finishes, where best_order is the best ordering so far.
+    Once best_length is at most target, the runs that have not started are cancelled and the generator stops.
+    Remaining keyword arguments are passed to the search, e.g. kinds or first_improvement for hill climbing, T and
+    alpha for simulated annealing.
+    """
+    if method not in MULTI_START_METHODS:
+        raise ValueError(f"Invalid method: {method}. Use one of {MULTI_START_METHODS}.")
+    engine = TourEngine(sites)
+    memory = shared_memory.SharedMemory(create=True, size=max(engine.dist.nbytes, 1))
+    executor = None
+    try:
+        np.ndarray(engine.dist.shape, dtype=float, buffer=memory.buf)[:] = engine.dist
+        executor = ProcessPoolExecutor(workers, initializer=_start_worker,
+                                       initargs=(engine.sites, memory.name, engine.dist.shape))
+        futures = {executor.submit(_run_start, method, run_seed, options): run
+                   for run, run_seed in enumerate(derive_seeds(seed, runs))}
+        best_order, best_length = None, math.inf
+        for future in as_completed(futures):
+            length, order = future.result()
+            if length < best_length:
+                best_order, best_length = order, length
+            yield futures[future], length, best_order, best_length
+            if target is not None and best_length <= target:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        memory.close()
+        memory.unlink()
+
+class CandidateTour:
+    """
+    Local search for orderings of many sites (100k and more) that never builds a distance matrix.
+    Each site keeps a list of its k nearest neighbors, found with a k-d tree, and 2-opt and or-opt moves are only
+    tried between a site and its candidates. Sites whose surroundings did not change are skipped with don't-look bits.
+    The ordering is stored in arrays: order[position] is a site and position[site] is its position.
+    As in the notebook, the first and last sites of the ordering stay fixed.
+    """
+    def __init__(self, sites, k=8):
+        self.sites = list(sites)
+        self.n = len(self.sites)
+        self.coords = np.asarray(self.sites, dtype=float)
+        self.x = self.coords[:, 0].tolist() # plain lists are faster than NumPy for single lookups
+        self.y = self.coords[:, 1].tolist()
+        self.k = min(k, self.n - 1)
+        self.neighbors = self.nearest_neighbors(self.k)
+        self.order = array("i", range(self.n))
+        self.position = array("i", range(self.n))
+        self.order_view = np.frombuffer(self.order, dtype=np.int32) # shares memory with order for bulk updates
+        self.position_view = np.frombuffer(self.position, dtype=np.int32)
+
+    def nearest_neighbors(self, k):
+        """
+        Returns a list with the k nearest other sites of every site, closest first.
+        """
+        _, nearest = KDTree(self.coords).query(self.coords, k=k + 1)
+        own = nearest == np.arange(self.n)[:, None]
+        own[~own.any(axis=1), -1] = True # duplicate sites can push a site out of its own list
+        return nearest[~own].reshape(self.n, k).tolist()
+
+    def distance(self, a, b):
+        """
+        Returns the distance between sites a and b.
+        """
+        return math.hypot(self.x[a] - self.x[b], self.y[a] - self.y[b])
+
+    def strip_order(self):
+        """
+        Returns a starting ordering that sweeps the sites in horizontal strips, alternating direction.
+        Its length is within a small constant factor of the optimum, so the local search starts from a good ordering.
+        """
+        middle = np.arange(1, self.n - 1)
+        if len(middle) == 0:
+            return list(range(self.n))
+        x, y = self.coords[middle, 0], self.coords[middle, 1]
+        strips = max(1, int(math.sqrt(len(middle) / 2)))
+        height = (y.max() - y.min()) / strips or 1.0
+        strip = np.minimum(((y - y.min()) / height).astype(int), strips - 1)
+        sweep = np.where(strip % 2 == 0, x, -x)
+        return [0] + middle[np.lexsort((sweep, strip))].tolist() + [self.n - 1]
+
+    def set_order(self, order):
+        """
+        Sets the current ordering from a list of site indices.
+        """
+        self.order_view[:] = order
+        self.position_view[self.order_view] = np.arange(self.n, dtype=np.int32)
+
+    def get_order(self):
+        """
+        Returns the current ordering as a list of site indices.
+        """
+        return self.order.tolist()
+
+    def ordering(self):
+        """
+        Returns the current ordering as a list of sites.
+        """
+        return [self.sites[index] for index in self.order]
+
+    def length(self):
+        """
+        Returns the total distance of the current ordering.
+        """
+        path = self.coords[self.order_view]
+        return float(np.sqrt(((path[1:] - path[:-1]) ** 2).sum(axis=1)).sum())
+
+    def evaluate(self):
+        """
+        Returns the total distance rounded to an integer, like evaluate in the notebook.
+        """
+        return round(self.length())
+
+    def two_opt_move(self, a):
+        """
+        Returns the best improving 2-opt move that adds an edge between site a and one of its candidates, or None.
+        The move is (gain, "2opt", first, last, touched sites), where first..last is the range of positions to reverse.
+        """
+        order, position, distance, n = self.order, self.position, self.distance, self.n
+        i = position[a]
+        best = None
+        best_gain = 1e-9
+        for step in (1, -1): # replace the edge to the next site, then the edge to the previous site
+            if not 0 <= i + step < n:
+                continue
+            b = order[i + step]
+            d_ab = distance(a, b)
+            for c in self.neighbors[a]:
+                gain_ac = d_ab - distance(a, c)
+                if gain_ac <= 0: # candidates are sorted, so no later candidate can help
+                    break
+                j = position[c]
+                if not 0 <= j + step < n:
+                    continue
+                d = order[j + step]
+                if c == b or d == a:
+                    continue
+                gain = gain_ac + distance(c, d) - distance(b, d)
+                if gain > best_gain:
+                    if step == 1:
+                        first, last = min(i, j) + 1, max(i, j)
+                    else:
+                        first, last = min(i, j), max(i, j) - 1
+                    best, best_gain = (gain, "2opt", first, last, (a, b, c, d)), gain
+        return best
+
+    def or_opt_move(self, a):
+        """
+        Returns the best improving or-opt move of a segment that starts or ends at site a, or None.
+        The segment is reinserted next to a candidate of a, in whichever direction puts a beside the candidate.
+        The move is (gain, "oropt", start, length, after, reverse, touched sites), where the segment is inserted after
+        the site at position after of the current ordering.
+        """
+        order, position, distance, n = self.order, self.position, self.distance, self.n
+        i = position[a]
+        best = None
+        best_gain = 1e-9
+        for length in OR_OPT_LENGTHS:
+            for start in {i, i - length + 1}:
+                end = start + length - 1
+                if start < 1 or end > n - 2:
+                    continue
+                first, last = order[start], order[end]
+                other = last if a == first else first
+                previous, following = order[start - 1], order[end + 1]
+                removed = distance(previous, first) + distance(last, following) - distance(previous, following)
+                for c in self.neighbors[a]:
+                    gain_ac = removed - distance(a, c)
+                    if gain_ac <= 0:
+                        break
+                    j = position[c]
+                    if start <= j <= end:
+                        continue
+                    if j + 1 < n and not start <= j + 1 <= end: # between c and the site after it
+                        after = order[j + 1]
+                        gain = gain_ac - distance(other, after) + distance(c, after)
+                        if gain > best_gain:
+                            best, best_gain = (gain, "oropt", start, length, j, a != first, (previous, following, first, last, c, after)), gain
+                    if j - 1 >= 0 and not start <= j - 1 <= end: # between the site before c and c
+                        before = order[j - 1]
+                        gain = gain_ac - distance(before, other) + distance(before, c)
+                        if gain > best_gain:
+                            best, best_gain = (gain, "oropt", start, length, j - 1, a != last, (previous, following, first, last, before, c)), gain
+        return best
+
+    def apply(self, move):
+        """
+        Applies a move returned by two_opt_move or or_opt_move to the current ordering.
+        Only the positions between the changed edges are rewritten.
+        """
+        order, position = self.order_view, self.position_view
+        if move[1] == "2opt":
+            _, _, first, last, _ = move
+            order[first:last + 1] = order[first:last + 1][::-1].copy()
+            position[order[first:last + 1]] = np.arange(first, last + 1, dtype=np.int32)
+            return
+        _, _, start, length, after, reverse, _ = move
+        segment = order[start:start + length].copy()
+        if reverse:
+            segment = segment[::-1]
+        if after > start:
+            low, high = start, after
+            order[start:after - length + 1] = order[start + length:after + 1].copy()
+            order[after - length + 1:after + 1] = segment
+        else:
+            low, high = after + 1, start + length - 1
+            order[after + 1 + length:start + length] = order[after + 1:start].copy()
+            order[after + 1:after + 1 + length] = segment
+        position[order[low:high + 1]] = np.arange(low, high + 1, dtype=np.int32)
+
+    def optimize(self, order=None, kinds=CANDIDATE_KINDS, max_moves=None):
+        """
+        Improves the ordering with candidate-restricted moves until no site can be improved and returns it.
+        Starts from the given ordering, or from strip_order if none is given.
+        Every site starts active; a site whose best move does not improve the ordering is switched off (its don't-look
+        bit is set) until a move changes one of its edges.
+        """
+        self.set_order(order if order is not None else self.strip_order())
+        searches = []
+        if "2opt" in kinds:
+            searches.append(self.two_opt_move)
+        if "oropt" in kinds:
+            searches.append(self.or_opt_move)
+        active = bytearray(b"\x01") * self.n
+        queue = deque(self.order)
+        moves = 0
+        while queue and (max_moves is None or moves < max_moves):
+            a = queue.popleft()
+            active[a] = 0
+            best = None
+            for search in searches:
+                move = search(a)
+                if move is not None and (best is None or move[0] > best[0]):
+                    best = move
+            if best is None:
+                continue
+            self.apply(best)
+            moves += 1
+            for site in (a,) + best[-1]:
+                if not active[site]:
+                    active[site] = 1
+                    queue.append(site)
+        return self.get_order()
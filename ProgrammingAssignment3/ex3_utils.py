@@ -1,3 +1,23 @@
+from collections import OrderedDict
+from numbers import Real
+import json
+import math
+import mmap
+import operator
+import os
+import re
+import struct
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+import pandas as pd
+
+ELIMINATION_HEURISTICS = ("min_fill", "min_degree") # elimination orderings supported by elimination_ask
+SAMPLING_METHODS = ("rejection", "likelihood_weighting", "gibbs") # approximate inference methods supported by Sampler
+BINARY_NET_MAGIC = b"BNT1" # first bytes of a binary network file
+BINARY_NET_HEADER = struct.Struct("<4sQ") # magic, length of the JSON metadata including padding
+CPT_TOLERANCE = 1e-6 # largest deviation from 1 allowed for the sum of a CPT distribution
+_BIF_TOKEN = re.compile(r'"[^"]*"|[{}()\[\],;|]|[^\s{}()\[\],;|"]+')
+
 class BayesNet:
     """
     A simple representation of a Bayesian Network.
@@ -21,9 +41,7 @@ class BayesNet:
         """
         if remove in self.nodes:
             new_bnet = BayesNet()
-            for node in self.nodes:
-                if node != remove:
-                    new_bnet.add_node(node)
+            new_bnet.nodes = [node for node in self.nodes if node != remove]
             return new_bnet
         else:
             raise ValueError("Node not found")
@@ -31,17 +49,947 @@ class BayesNet:
     def is_empty(self):
         return len(self.nodes) == 0
 
+    def get_node(self, name):
+        """
+        Returns the variable with the given name, or None if there is none.
+        """
+        for node in self.nodes:
+            if node.name == name:
+                return node
+        return None
+
+    @classmethod
+    def from_tables(cls, states, definitions, order=None):
+        """
+        Builds a BayesNet from variable states {name: [state names]} and definitions {name: ([parent names], table)},
+        creating every variable after its parents. Nodes are added in topological order, with ties kept in order.
+        """
+        order = list(order or states)
+        children = {name: [] for name in order}
+        remaining = {}
+        for name in order:
+            parents, _ = definitions[name]
+            remaining[name] = len(parents)
+            for parent in parents:
+                children[parent].append(name)
+        ready = [name for name in order if remaining[name] == 0]
+        variables = {}
+        bnet = cls()
+        for name in ready:
+            parents, table = definitions[name]
+            variables[name] = Variable.from_table(name, table, [variables[p] for p in parents], states[name])
+            bnet.add_node(variables[name])
+            for child in children[name]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+        if len(ready) != len(order):
+            raise ValueError("The network has a cycle")
+        return bnet
+
+    @classmethod
+    def load_bif(cls, path):
+        """
+        Loads a network from a BIF file, reading it one line at a time.
+        Values are numbered in the order the states are declared. As in JavaBayes, the numbers after "table" list the
+        distribution of the child for every parent configuration with the child's value varying slowest.
+        """
+        states = {}
+        definitions = {}
+        with open(path, "r") as f:
+            tokens = _bif_tokens(f)
+            for token in tokens:
+                if token == "network":
+                    _skip_bif_block(tokens)
+                elif token == "variable":
+                    name = next(tokens)
+                    states[name] = _parse_bif_variable(tokens)
+                elif token == "probability":
+                    child, parents, table, default, rows = _parse_bif_probability(tokens)
+                    definitions[child] = (parents, table, default, rows)
+        for name, (parents, values, default, rows) in definitions.items():
+            shape = [len(states[parent]) for parent in parents] + [len(states[name])]
+            table = np.full(shape, np.nan)
+            if default is not None:
+                table[...] = default
+            if values is not None:
+                table[...] = np.moveaxis(np.reshape(values, shape[-1:] + shape[:-1]), 0, -1)
+            for row, probabilities in rows:
+                table[tuple(states[parent].index(state) for parent, state in zip(parents, row))] = probabilities
+            definitions[name] = (parents, table)
+        return cls.from_tables(states, definitions)
+
+    @classmethod
+    def load_xml_bif(cls, path):
+        """
+        Loads a network from an XML-BIF file with a streaming XML parser.
+        Each TABLE lists the distribution of the FOR variable for every configuration of the GIVEN variables, with the
+        FOR variable's value varying fastest.
+        """
+        states = {}
+        definitions = {}
+        for _, element in ElementTree.iterparse(path):
+            tag = element.tag.upper()
+            if tag == "VARIABLE":
+                name = _xml_text(element, "NAME")
+                states[name] = [outcome.text.strip() for outcome in element if outcome.tag.upper() in ("OUTCOME", "VALUE")]
+                element.clear()
+            elif tag in ("DEFINITION", "PROBABILITY"):
+                child = _xml_text(element, "FOR")
+                parents = [given.text.strip() for given in element if given.tag.upper() == "GIVEN"]
+                values = np.array(_xml_text(element, "TABLE").split(), dtype=float)
+                definitions[child] = (parents, values)
+                element.clear()
+        for name, (parents, values) in definitions.items():
+            definitions[name] = (parents, values.reshape([len(states[p]) for p in parents] + [len(states[name])]))
+        return cls.from_tables(states, definitions)
+
+    def save_binary(self, path):
+        """
+        Writes the network as a binary file: a fixed header, JSON metadata with the variables, their states and
+        parents, and then every CPT as little-endian float64 values, aligned to 8 bytes.
+        """
+        order = topological_order(self)
+        index = {var: i for i, var in enumerate(order)}
+        entries = []
+        offset = 0
+        for var in order:
+            entries.append({"name": var.name, "states": var.states, "parents": [index[p] for p in var.parents or []],
+                            "shape": list(var.valid_table.shape), "offset": offset})
+            offset += var.table.size
+        metadata = json.dumps({"nodes": [index[var] for var in self.nodes], "variables": entries}).encode()
+        metadata += b" " * (-(BINARY_NET_HEADER.size + len(metadata)) % 8)
+        with open(path, "wb") as f:
+            f.write(BINARY_NET_HEADER.pack(BINARY_NET_MAGIC, len(metadata)))
+            f.write(metadata)
+            for var in order:
+                f.write(np.ascontiguousarray(var.table, dtype="<f8").tobytes())
+
+    @classmethod
+    def load_binary(cls, path):
+        """
+        Loads a network written by save_binary.
+        The CPTs are memory-mapped copy-on-write instead of read, so loading takes about the time needed to parse the
+        metadata, and changes made to the tables are never written back to the file.
+        Raises ValueError if the file is not a binary network file or its size does not match the metadata.
+        """
+        with open(path, "rb") as f:
+            header = f.read(BINARY_NET_HEADER.size)
+            if len(header) < BINARY_NET_HEADER.size:
+                raise ValueError(f"{path} is too short for a binary network header: {len(header)} of {BINARY_NET_HEADER.size} bytes")
+            magic, length = BINARY_NET_HEADER.unpack(header)
+            if magic != BINARY_NET_MAGIC:
+                raise ValueError(f"{path} is not a binary network file")
+            size = os.fstat(f.fileno()).st_size - BINARY_NET_HEADER.size
+            if size < length:
+                raise ValueError(f"{path} has {size} bytes after the header, expected at least {length} bytes of metadata")
+            try:
+                metadata = json.loads(f.read(length))
+                values = sum(math.prod(entry["shape"]) for entry in metadata["variables"])
+            except (ValueError, KeyError, TypeError) as error:
+                raise ValueError(f"{path} has invalid metadata: {error}") from error
+            if size - length != values * 8:
+                raise ValueError(f"{path} has {size - length} bytes of CPT data, expected {values * 8}")
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) if metadata["variables"] else b""
+        data = np.frombuffer(buffer, dtype="<f8", offset=BINARY_NET_HEADER.size + length if buffer else 0)
+        variables = []
+        for entry in metadata["variables"]:
+            table = data[entry["offset"]:entry["offset"] + math.prod(entry["shape"])].reshape(entry["shape"])
+            parents = [variables[i] for i in entry["parents"]]
+            variables.append(Variable.from_table(entry["name"], table, parents, entry["states"], validate=False))
+        bnet = cls()
+        for i in metadata["nodes"]:
+            bnet.add_node(variables[i])
+        return bnet
+
+def _bif_tokens(f):
+    """
+    Yields the tokens of a BIF file one line at a time, dropping // comments and the quotes around names.
+    """
+    for line in f:
+        for token in _BIF_TOKEN.findall(line.split("//", 1)[0]):
+            yield token.strip('"')
+
+def _skip_bif_block(tokens):
+    """
+    Consumes tokens up to the end of the next { } block.
+    """
+    depth = 0
+    for token in tokens:
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return
+
+def _bif_until(tokens, end):
+    """
+    Returns the tokens up to the end token, without the commas.
+    """
+    values = []
+    for token in tokens:
+        if token == end:
+            return values
+        if token != ",":
+            values.append(token)
+    raise ValueError(f"Unexpected end of BIF file, expected {end!r}")
+
+def _parse_bif_variable(tokens):
+    """
+    Parses the body of a variable block and returns its state names.
+    """
+    states = None
+    _bif_until(tokens, "{")
+    for token in tokens:
+        if token == "}":
+            return states
+        if token == "type":
+            _bif_until(tokens, "{")
+            states = _bif_until(tokens, "}")
+        _bif_until(tokens, ";")
+    raise ValueError("Unexpected end of BIF file in a variable block")
+
+def _parse_bif_probability(tokens):
+    """
+    Parses a probability block and returns the child, its parents, and the table, default and per-configuration
+    rows of probabilities given in it.
+    """
+    names = _bif_until(tokens, ")")[1:] # skip the opening parenthesis
+    child = names[0]
+    parents = [name for name in names[1:] if name != "|"]
+    table, default, rows = None, None, []
+    _bif_until(tokens, "{")
+    for token in tokens:
+        if token == "}":
+            return child, parents, table, default, rows
+        if token == "table":
+            table = [float(value) for value in _bif_until(tokens, ";")]
+        elif token == "default":
+            default = [float(value) for value in _bif_until(tokens, ";")]
+        elif token == "(":
+            row = _bif_until(tokens, ")")
+            rows.append((row, [float(value) for value in _bif_until(tokens, ";")]))
+        else:
+            _bif_until(tokens, ";")
+    raise ValueError("Unexpected end of BIF file in a probability block")
+
+def _xml_text(element, tag):
+    """
+    Returns the stripped text of the first child of element with the given tag, ignoring case.
+    """
+    for child in element:
+        if child.tag.upper() == tag:
+            return child.text.strip()
+    raise ValueError(f"Missing {tag} in XML-BIF {element.tag}")
+
 class Variable:
     """
     A variable in a Bayesian Network.
+    Binary variables take P(variable=1) for each parent configuration, as in the notebook. Variables with more values
+    take a sequence with the probability of each value instead, e.g. Variable("Age", [0.3, 0.5, 0.2]).
+    Besides the cpt dictionary, the CPT is stored as a dense NumPy array, table[parent values..., value].
     """
-    def __init__(self, name, cpt, parents=None):
+    def __init__(self, name, cpt, parents=None, states=None):
         self.name = name
         self.parents = parents
+        self.states = states # names of the values, if known
         if parents is None:
-            self.cpt = {0: 1-cpt, 1: cpt}
+            self.cpt = self._distribution(cpt)
+            rows = {(): self.cpt}
         else:
             self.cpt = {}
+            rows = {}
             for key, value in cpt.items():
-                self.cpt.update({key: {0: 1-value, 1: value}})
+                self.cpt.update({key: self._distribution(value)})
+                parent_values = key if isinstance(key, tuple) else (key,)
+                # bool keys would be read as a mask by NumPy, so every parent value is converted to an integer index
+                rows[tuple(operator.index(parent_value) for parent_value in parent_values)] = self.cpt[key]
+        self.size = len(next(iter(rows.values()))) # number of values
+        self.table = np.full([parent.size for parent in parents or []] + [self.size], np.nan)
+        for key, distribution in rows.items():
+            if len(distribution) != self.size:
+                raise ValueError(f"Invalid distribution for {name} given {key}: {distribution}")
+            self.table[key] = list(distribution.values())
+        self._valid = False # set by validate, which the array-based inference runs before using the table
+
+    @classmethod
+    def from_table(cls, name, table, parents=None, states=None, validate=True):
+        """
+        Creates a variable directly from its CPT array table[parent values..., value].
+        The cpt dictionary is only built if it is used. With validate=False the table is trusted as it is, e.g. when it
+        was written by BayesNet.save_binary.
+        """
+        variable = cls.__new__(cls)
+        variable.name = name
+        variable.parents = parents or None
+        variable.states = states
+        variable.size = table.shape[-1]
+        variable.table = table
+        variable._cpt = None
+        variable._valid = not validate
+        if validate:
+            variable.validate()
+        return variable
+
+    @property
+    def cpt(self):
+        if self._cpt is None:
+            if self.parents is None:
+                self._cpt = dict(enumerate(self.table.tolist()))
+            else:
+                self._cpt = {}
+                for key in np.ndindex(self.table.shape[:-1]):
+                    self._cpt[key if len(key) > 1 else key[0]] = dict(enumerate(self.table[key].tolist()))
+        return self._cpt
+
+    @cpt.setter
+    def cpt(self, cpt):
+        self._cpt = cpt
+
+    @property
+    def valid_table(self):
+        """
+        The CPT array, validated the first time it is used.
+        """
+        if not self._valid:
+            self.validate()
+        return self.table
+
+    def validate(self, tolerance=CPT_TOLERANCE):
+        """
+        Checks that the CPT has one distribution per parent configuration, with non-negative probabilities that sum to
+        1 within tolerance. Raises a ValueError describing the first distribution that does not.
+        Variables accept incomplete CPTs like before, so this is only run by the array-based inference.
+        """
+        shape = tuple(parent.size for parent in self.parents or []) + (self.size,)
+        if self.table.shape != shape:
+            raise ValueError(f"The CPT of {self.name} has shape {self.table.shape}, expected {shape}")
+        rows = self.table.reshape(-1, self.size)
+        sums = rows.sum(axis=-1)
+        for row in range(len(rows)):
+            if np.isnan(rows[row]).any():
+                raise ValueError(f"The CPT of {self.name} has no distribution{self._given(row)}")
+            if (rows[row] < 0).any():
+                raise ValueError(f"The distribution of {self.name}{self._given(row)} has negative probabilities: "
+                                 f"{rows[row].tolist()}")
+            if abs(sums[row] - 1) > tolerance:
+                raise ValueError(f"The distribution of {self.name}{self._given(row)} sums to {sums[row]:.10g}, "
+                                 f"not 1 (tolerance {tolerance:g})")
+        self._valid = True
+
+    def _given(self, row):
+        """
+        Describes the parent configuration of a row of the CPT, e.g. " given Young=1, HighIncome=0".
+        """
+        if not self.parents:
+            return ""
+        values = np.unravel_index(row, self.table.shape[:-1])
+        return " given " + ", ".join(f"{parent.name}={int(value)}" for parent, value in zip(self.parents, values))
+
+    @staticmethod
+    def _distribution(p):
+        """
+        Returns the distribution {value: probability} given P(=1) of a binary variable or a sequence of probabilities.
+        """
+        if isinstance(p, Real):
+            return {0: 1-p, 1: p}
+        return dict(enumerate(p))
+
+class Factor:
+    """
+    A factor of a Bayesian Network: a table of non-negative numbers indexed by the values of its variables.
+    The table is a NumPy array with one axis per variable, in the order of variables.
+    """
+    def __init__(self, variables, values):
+        self.variables = tuple(variables)
+        self.values = values
+
+    @classmethod
+    def from_variable(cls, variable, evidence=None):
+        """
+        Builds the factor P(variable | parents) of a variable's CPT, restricted to the observed values in evidence.
+        """
+        parents = list(variable.parents or [])
+        factor = cls(parents + [variable], variable.valid_table)
+        if evidence:
+            factor = factor.restrict(evidence)
+        return factor
+
+    def restrict(self, evidence):
+        """
+        Returns the factor with the observed variables fixed to their values in evidence and removed.
+        """
+        index = tuple(evidence[var] if var in evidence else slice(None) for var in self.variables)
+        return Factor([var for var in self.variables if var not in evidence], self.values[index])
+
+    def normalize(self):
+        """
+        Returns the factor scaled so that its values sum to 1.
+        """
+        return Factor(self.variables, self.values / self.values.sum())
+
+def multiply_and_sum_out(factors, variable=None):
+    """
+    Multiplies the factors together and sums out the variable, in one np.einsum call.
+    If variable is None nothing is summed out.
+    """
+    labels = {}
+    operands = []
+    for factor in factors:
+        operands.append(factor.values)
+        operands.append([labels.setdefault(var, len(labels)) for var in factor.variables])
+    variables = [var for var in labels if var is not variable]
+    operands.append([labels[var] for var in variables])
+    return Factor(variables, np.einsum(*operands, optimize=len(factors) > 2))
+
+def relevant_variables(X, e, bnet):
+    """
+    Returns the variables of bnet that are ancestors of the query or evidence variables (including themselves).
+    Every other variable is barren: it sums out to 1 and cannot change the answer.
+    """
+    relevant = set()
+    stack = [X] + list(e)
+    while stack:
+        var = stack.pop()
+        if var not in relevant:
+            relevant.add(var)
+            stack.extend(var.parents or [])
+    return [var for var in bnet.nodes if var in relevant]
+
+def elimination_order(factors, hidden, heuristic="min_fill"):
+    """
+    Returns a greedy order in which to eliminate the hidden variables.
+    min_fill picks the variable whose elimination adds the fewest new edges between its neighbors in the interaction
+    graph; min_degree picks the variable with the fewest neighbors. Ties go to the variable listed first in hidden.
+    """
+    if heuristic not in ELIMINATION_HEURISTICS:
+        raise ValueError(f"Invalid heuristic: {heuristic}. Use one of {ELIMINATION_HEURISTICS}.")
+    neighbors = {}
+    for factor in factors:
+        for var in factor.variables:
+            neighbors.setdefault(var, set()).update(factor.variables)
+    for var, adjacent in neighbors.items():
+        adjacent.discard(var)
+    def cost(var):
+        adjacent = neighbors.get(var, set())
+        if heuristic == "min_degree":
+            return len(adjacent)
+        return sum(1 for a in adjacent for b in adjacent if a is not b and b not in neighbors[a]) // 2
+    remaining = list(hidden)
+    order = []
+    while remaining:
+        var = min(remaining, key=cost)
+        remaining.remove(var)
+        order.append(var)
+        adjacent = neighbors.pop(var, set())
+        for a in adjacent:
+            neighbors[a].discard(var)
+            neighbors[a].update(adjacent - {a})
+    return order
+
+def elimination_ask(X, e, bnet, heuristic="min_fill"):
+    """
+    Computes the distribution of X given evidence e with variable elimination.
+    Takes the same arguments and returns the same dictionary as enumeration_ask, e.g. {0: 0.73, 1: 0.27}.
+    Barren variables are pruned first, and the hidden variables are eliminated in a min-fill or min-degree order,
+    so the cost grows with the size of the largest intermediate factor instead of exponentially with the network.
+    """
+    e = {var: value for var, value in e.items() if var is not X}
+    variables = relevant_variables(X, e, bnet)
+    factors = [Factor.from_variable(var, e) for var in variables]
+    hidden = [var for var in variables if var is not X and var not in e]
+    for var in elimination_order(factors, hidden, heuristic):
+        joined = [factor for factor in factors if var in factor.variables]
+        factors = [factor for factor in factors if var not in factor.variables]
+        factors.append(multiply_and_sum_out(joined, var))
+    result = multiply_and_sum_out(factors).normalize()
+    return {value: float(p) for value, p in enumerate(result.values)}
+
+BATCH = "batch" # label of the batch axis of the factors used by batch_ask
 
+def _evidence_columns(evidence, bnet):
+    """
+    Converts a DataFrame or a dictionary of columns to {variable: float array}, where NaN marks missing evidence.
+    Columns are matched to variables by name (or by the Variable itself for dictionaries); other columns are ignored.
+    """
+    by_name = {var.name: var for var in bnet.nodes}
+    columns = {}
+    for key in evidence:
+        var = key if isinstance(key, Variable) else by_name.get(key)
+        if var is None:
+            continue
+        column = evidence[key]
+        if hasattr(column, "to_numpy"):
+            columns[var] = column.to_numpy(dtype=float, na_value=np.nan)
+        else:
+            columns[var] = np.asarray(column, dtype=float)
+    return columns
+
+def batch_ask(queries, evidence, bnet, heuristic="min_fill", batch_size=10000, value=1):
+    """
+    Computes P(query=value) for every query variable and every row of an evidence table.
+    evidence is a DataFrame with one column per observed variable (matched by name) or a dictionary of columns keyed
+    by Variable or name. Missing values (NaN or None) mean the variable is unobserved in that row, so every row can
+    have different evidence.
+    Returns a matrix with one row per evidence row and one column per query, as a DataFrame with the query names
+    as columns if evidence is a DataFrame.
+    Each query is answered for all rows at once by variable elimination on factors with an extra batch axis:
+    observations enter as per-row indicator factors, which are all ones where the value is missing.
+    Rows are processed in chunks of batch_size to bound memory use.
+    """
+    if isinstance(queries, Variable):
+        queries = [queries]
+    columns = _evidence_columns(evidence, bnet)
+    rows = len(next(iter(columns.values()))) if columns else len(evidence)
+    result = np.empty((rows, len(queries)))
+    for q, X in enumerate(queries):
+        observed = [var for var in columns if var is not X]
+        variables = relevant_variables(X, dict.fromkeys(observed), bnet)
+        factors = [Factor.from_variable(var) for var in variables]
+        hidden = [var for var in variables if var is not X]
+        order = elimination_order(factors, hidden, heuristic)
+        for start in range(0, rows, batch_size):
+            stop = min(start + batch_size, rows)
+            batch = list(factors)
+            for var in observed:
+                values = columns[var][start:stop]
+                size = var.size
+                indicator = (values[:, None] == np.arange(size)[None, :]) | np.isnan(values)[:, None]
+                batch.append(Factor([BATCH, var], indicator.astype(float)))
+            for var in order:
+                joined = [factor for factor in batch if var in factor.variables]
+                batch = [factor for factor in batch if var not in factor.variables]
+                batch.append(multiply_and_sum_out(joined, var))
+            joint = multiply_and_sum_out(batch)
+            if BATCH in joint.variables:
+                values = np.moveaxis(joint.values, joint.variables.index(BATCH), 0)
+            else:
+                values = np.broadcast_to(joint.values, (stop - start,) + joint.values.shape)
+            result[start:stop, q] = values[:, value] / values.sum(axis=1)
+    if isinstance(evidence, pd.DataFrame):
+        return pd.DataFrame(result, index=evidence.index, columns=[X.name for X in queries])
+    return result
+
+def triangulate(factors, order):
+    """
+    Eliminates the variables of the factors' interaction graph in the given order and returns the maximal cliques of
+    the resulting triangulated graph, each as a set of variables.
+    """
+    neighbors = {}
+    for factor in factors:
+        for var in factor.variables:
+            neighbors.setdefault(var, set()).update(factor.variables)
+    for var, adjacent in neighbors.items():
+        adjacent.discard(var)
+    cliques = []
+    for var in order:
+        adjacent = neighbors.pop(var, set())
+        clique = adjacent | {var}
+        if not any(clique <= other for other in cliques):
+            cliques.append(clique)
+        for a in adjacent:
+            neighbors[a].discard(var)
+            neighbors[a].update(adjacent - {a})
+    return [clique for clique in cliques if not any(clique < other for other in cliques)]
+
+class JunctionTree:
+    """
+    A BayesNet compiled into a junction tree for answering many queries on the same network.
+    Compiling moralizes and triangulates the network (with the same greedy orderings as elimination_ask), connects
+    the cliques with a maximum spanning tree on separator sizes and multiplies every CPT into one clique.
+    Each evidence set then needs a single calibration (one collect and one distribute pass of messages), after which
+    the marginal of every variable is read from its smallest clique.
+    Calibrated states are cached per evidence set with LRU eviction, so repeated evidence is answered without any
+    message passing.
+    The network is snapshotted when the tree is compiled; compile a new tree after changing the network.
+    """
+    def __init__(self, bnet, cache_size=128, heuristic="min_fill"):
+        self.variables = list(bnet.nodes)
+        self.cache_size = cache_size # maximum number of cached calibrations
+        factors = [Factor.from_variable(var) for var in self.variables]
+        position = {var: i for i, var in enumerate(self.variables)}
+        cliques = triangulate(factors, elimination_order(factors, self.variables, heuristic))
+        self.cliques = [tuple(sorted(clique, key=position.get)) for clique in cliques] # variables of each clique
+        self.potentials = [np.ones([var.size for var in clique]) for clique in self.cliques]
+        for factor in factors:
+            i = self._home(factor.variables)
+            self.potentials[i] = multiply_and_sum_out([Factor(self.cliques[i], self.potentials[i]), factor]).values
+        self.home = {var: self._home((var,)) for var in self.variables} # smallest clique containing each variable
+        self.neighbors = [[] for _ in self.cliques] # adjacent cliques in the tree
+        self._connect()
+        self.order = [] # cliques in breadth-first order from clique 0, parents before children
+        self.parent = [None] * len(self.cliques)
+        queue = [0] if self.cliques else []
+        for i in queue:
+            self.order.append(i)
+            for j in self.neighbors[i]:
+                if j != self.parent[i]:
+                    self.parent[j] = i
+                    queue.append(j)
+        self._calibrations = OrderedDict() # evidence -> beliefs of every clique, least recently used first
+        self.calibrations = 0 # number of calibrations computed (cache misses)
+
+    def _home(self, variables):
+        """
+        Returns the index of the smallest clique that contains all the variables.
+        """
+        return min((i for i, clique in enumerate(self.cliques) if set(variables) <= set(clique)),
+                   key=lambda i: self.potentials[i].size)
+
+    def _connect(self):
+        """
+        Connects the cliques with a maximum spanning tree on the sizes of their intersections (Kruskal's algorithm).
+        Cliques that share no variable are connected with empty separators, so the result is always a single tree.
+        """
+        edges = sorted(((len(set(a) & set(b)), i, j) for i, a in enumerate(self.cliques)
+                        for j, b in enumerate(self.cliques) if i < j), reverse=True)
+        component = list(range(len(self.cliques)))
+        def find(i):
+            while component[i] != i:
+                component[i] = component[component[i]]
+                i = component[i]
+            return i
+        for _, i, j in edges:
+            a, b = find(i), find(j)
+            if a != b:
+                component[a] = b
+                self.neighbors[i].append(j)
+                self.neighbors[j].append(i)
+
+    def _message(self, i, j, potential, messages):
+        """
+        Returns the message from clique i to clique j: the potential of i times the messages it received from every
+        other neighbor, summed down to the separator. Messages are normalized to avoid underflow.
+        """
+        incoming = [messages[k, i] for k in self.neighbors[i] if k != j]
+        separator = [var for var in self.cliques[i] if var in self.cliques[j]]
+        labels = {var: n for n, var in enumerate(self.cliques[i])}
+        operands = [potential, list(range(len(self.cliques[i])))]
+        for factor in incoming:
+            operands += [factor.values, [labels[var] for var in factor.variables]]
+        operands.append([labels[var] for var in separator])
+        values = np.einsum(*operands)
+        total = values.sum()
+        return Factor(separator, values / total if total > 0 else values)
+
+    def calibrate(self, e):
+        """
+        Returns the calibrated beliefs of every clique given evidence e, normalized to sum to 1.
+        Results are cached per evidence set.
+        """
+        key = frozenset(e.items())
+        beliefs = self._calibrations.get(key)
+        if beliefs is not None:
+            self._calibrations.move_to_end(key)
+            return beliefs
+        potentials = list(self.potentials)
+        for var, value in e.items():
+            i = self.home[var]
+            indicator = np.zeros(var.size)
+            indicator[value] = 1
+            axis = self.cliques[i].index(var)
+            potentials[i] = potentials[i] * indicator.reshape([-1 if n == axis else 1 for n in range(potentials[i].ndim)])
+        messages = {}
+        for i in reversed(self.order[1:]): # collect towards clique 0
+            messages[i, self.parent[i]] = self._message(i, self.parent[i], potentials[i], messages)
+        for i in self.order: # distribute from clique 0
+            for j in self.neighbors[i]:
+                if j != self.parent[i]:
+                    messages[i, j] = self._message(i, j, potentials[i], messages)
+        beliefs = []
+        for i, clique in enumerate(self.cliques):
+            factors = [Factor(clique, potentials[i])] + [messages[k, i] for k in self.neighbors[i]]
+            belief = multiply_and_sum_out(factors).values
+            total = belief.sum()
+            if total == 0:
+                raise ValueError("The evidence has probability 0")
+            beliefs.append(belief / total)
+        self.calibrations += 1
+        self._calibrations[key] = beliefs
+        if len(self._calibrations) > self.cache_size:
+            self._calibrations.popitem(last=False)
+        return beliefs
+
+    def marginal(self, X, beliefs):
+        """
+        Returns the distribution of X from calibrated beliefs as a dictionary, like enumeration_ask.
+        """
+        i = self.home[X]
+        axes = tuple(n for n, var in enumerate(self.cliques[i]) if var is not X)
+        values = beliefs[i].sum(axis=axes)
+        return {value: float(p) for value, p in enumerate(values / values.sum())}
+
+    def ask(self, X, e):
+        """
+        Computes the distribution of X given evidence e. Takes the same arguments as enumeration_ask (without the
+        network) and returns the same dictionary.
+        """
+        e = {var: value for var, value in e.items() if var is not X}
+        return self.marginal(X, self.calibrate(e))
+
+    def marginals(self, e):
+        """
+        Returns the distribution of every variable given evidence e from a single calibration.
+        """
+        beliefs = self.calibrate(e)
+        return {var: self.marginal(var, beliefs) for var in self.variables}
+
+def topological_order(bnet):
+    """
+    Returns the variables of bnet ordered so that every variable comes after its parents.
+    Raises a ValueError if a parent is missing from the network or the network has a cycle.
+    """
+    remaining = {var: len(var.parents or []) for var in bnet.nodes}
+    children = {var: [] for var in bnet.nodes}
+    for var in bnet.nodes:
+        for parent in var.parents or []:
+            if parent not in children:
+                raise ValueError(f"Parent {parent.name} of {var.name} is not in the network")
+            children[parent].append(var)
+    order = [var for var in bnet.nodes if remaining[var] == 0]
+    for var in order:
+        for child in children[var]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                order.append(child)
+    if len(order) != len(bnet.nodes):
+        raise ValueError("The network has a cycle")
+    return order
+
+class Sampler:
+    """
+    Approximate inference on a BayesNet by sampling, for networks too large for exact inference.
+    Samples are drawn in NumPy batches: every variable is sampled for the whole batch at once, in topological order,
+    by indexing its CPT array with the columns of its parents.
+    Methods:
+        "rejection"             forward samples, keeping those consistent with the evidence
+        "likelihood_weighting"  fixes the evidence and weights each sample by its likelihood
+        "gibbs"                 runs parallel Markov chains that resample each hidden variable given its Markov blanket
+    After each query, samples, effective_sample_size and standard_error (the largest standard error of the returned
+    probabilities) describe the estimate.
+    """
+    def __init__(self, bnet, method="likelihood_weighting", batch_size=10000, chains=1000, burn_in=100, rng=None):
+        if method not in SAMPLING_METHODS:
+            raise ValueError(f"Invalid method: {method}. Use one of {SAMPLING_METHODS}.")
+        self.bnet = bnet
+        self.method = method
+        self.batch_size = batch_size # samples drawn per batch by rejection sampling and likelihood weighting
+        self.chains = chains # parallel chains run by Gibbs sampling
+        self.burn_in = burn_in # Gibbs sweeps discarded before counting
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.variables = topological_order(bnet)
+        self.tables = {var: var.valid_table for var in self.variables} # CPT arrays [parents..., value]
+        self.samples = 0
+        self.effective_sample_size = 0.0
+        self.standard_error = math.inf
+
+    def _likelihood(self, var, columns):
+        """
+        Returns P(var=value | parents) for every sample, given the sampled columns.
+        """
+        return self.tables[var][tuple(columns[parent] for parent in var.parents or []) + (columns[var],)]
+
+    def _draw(self, probabilities):
+        """
+        Draws one value per row of a (samples, values) matrix of probabilities.
+        """
+        cumulative = np.cumsum(probabilities, axis=1)
+        u = self.rng.random(len(probabilities)) * cumulative[:, -1]
+        return np.minimum((u[:, None] >= cumulative).sum(axis=1), probabilities.shape[1] - 1)
+
+    def _forward(self, variables, e, n, weighted):
+        """
+        Samples n values of every variable in topological order and returns the columns and the sample weights.
+        If weighted, the evidence variables are fixed and the weights are their likelihoods; otherwise all are sampled.
+        """
+        columns = {}
+        weights = np.ones(n)
+        for var in variables:
+            if weighted and var in e:
+                columns[var] = np.full(n, e[var])
+                weights *= self._likelihood(var, columns)
+            else:
+                table = self.tables[var][tuple(columns[parent] for parent in var.parents or [])]
+                columns[var] = self._draw(np.broadcast_to(table, (n, table.shape[-1])))
+        return columns, weights
+
+    def _report(self, p, effective_sample_size, samples):
+        """
+        Records the sample count, effective sample size and standard error of the estimate p.
+        """
+        self.samples = samples
+        self.effective_sample_size = float(effective_sample_size)
+        if effective_sample_size > 0:
+            self.standard_error = float(np.sqrt((p * (1 - p)).max() / effective_sample_size))
+        else:
+            self.standard_error = math.inf
+
+    def ask(self, X, e, precision=None, max_samples=1000000):
+        """
+        Estimates the distribution of X given evidence e and returns it as a dictionary, like enumeration_ask.
+        Sampling stops after max_samples samples, or earlier once the standard error is at most precision.
+        """
+        e = {var: value for var, value in e.items() if var is not X}
+        relevant = set(relevant_variables(X, e, self.bnet))
+        variables = [var for var in self.variables if var in relevant]
+        if self.method == "gibbs":
+            p = self._gibbs(X, e, variables, precision, max_samples)
+        else:
+            p = self._weighted(X, e, variables, precision, max_samples)
+        return {value: float(probability) for value, probability in enumerate(p)}
+
+    def _weighted(self, X, e, variables, precision, max_samples):
+        """
+        Rejection sampling and likelihood weighting: both estimate P(X) as a weighted average over samples,
+        with 0/1 weights for rejection sampling. The effective sample size is (sum of weights)^2 / sum of squared weights.
+        """
+        size = X.size
+        totals = np.zeros(size)
+        weight_sum, weight_squares, samples = 0.0, 0.0, 0
+        p = np.full(size, np.nan)
+        while samples < max_samples:
+            n = min(self.batch_size, max_samples - samples)
+            weighted = self.method == "likelihood_weighting"
+            columns, weights = self._forward(variables, e, n, weighted)
+            if not weighted:
+                for var, value in e.items():
+                    weights *= columns[var] == value
+            totals += np.bincount(columns[X], weights=weights, minlength=size)
+            weight_sum += weights.sum()
+            weight_squares += (weights ** 2).sum()
+            samples += n
+            if weight_sum > 0:
+                p = totals / weight_sum
+                self._report(p, weight_sum ** 2 / weight_squares, samples)
+            else:
+                self._report(p, 0, samples)
+            if precision is not None and self.standard_error <= precision:
+                break
+        if weight_sum == 0:
+            raise ValueError("No samples were consistent with the evidence")
+        return p
+
+    def _gibbs(self, X, e, variables, precision, max_samples):
+        """
+        Gibbs sampling with independent parallel chains, started from likelihood weighting samples.
+        The standard error is estimated from the spread of the per-chain averages.
+        """
+        children = {var: [] for var in variables}
+        for var in variables:
+            for parent in var.parents or []:
+                children[parent].append(var)
+        hidden = [var for var in variables if var not in e]
+        chains = self.chains
+        columns, _ = self._forward(variables, e, chains, True)
+        size = X.size
+        counts = np.zeros((chains, size))
+        sweeps = 0
+        p = np.full(size, np.nan)
+        for sweep in range(self.burn_in + max(1, max_samples // chains)):
+            for var in hidden:
+                scores = np.empty((chains, var.size))
+                for value in range(scores.shape[1]):
+                    columns[var] = np.full(chains, value)
+                    score = self._likelihood(var, columns)
+                    for child in children[var]:
+                        score = score * self._likelihood(child, columns)
+                    scores[:, value] = score
+                columns[var] = self._draw(scores)
+            if sweep < self.burn_in:
+                continue
+            counts[np.arange(chains), columns[X]] += 1
+            sweeps += 1
+            if sweeps % 10 == 0 or sweeps * chains >= max_samples:
+                means = counts / sweeps
+                p = means.mean(axis=0)
+                error = means.std(axis=0, ddof=1).max() / math.sqrt(chains) if chains > 1 else math.inf
+                variance = (p * (1 - p)).max()
+                self._report(p, variance / error ** 2 if error > 0 else sweeps * chains, sweeps * chains)
+                if precision is not None and self.standard_error <= precision:
+                    break
+        return p
+
+class CompactNet:
+    """
+    An array-based form of a BayesNet for fast lookups.
+    The network is validated and put in topological order once, and each variable gets an integer index (its position
+    in that order). Each CPT is a dense array with one row per parent configuration: the row for an assignment is the
+    dot product of the parents' values with their strides, so lookups build no dictionaries or tuples.
+    Assignments are integer arrays indexed by variable index, with -1 for unobserved variables.
+    """
+    def __init__(self, bnet):
+        self.variables = topological_order(bnet)
+        self.index = {var: i for i, var in enumerate(self.variables)} # variable -> integer index
+        self.sizes = np.array([var.size for var in self.variables], dtype=np.intp) # number of values of each variable
+        self.parents = [] # parent indices of each variable
+        self.strides = [] # stride of each parent in the rows of the variable's table
+        self.tables = [] # CPT of each variable as a (parent configurations, values) array
+        for var in self.variables:
+            parents = np.array([self.index[parent] for parent in var.parents or []], dtype=np.intp)
+            strides = np.ones(len(parents), dtype=np.intp)
+            for k in range(len(parents) - 2, -1, -1):
+                strides[k] = strides[k + 1] * self.sizes[parents[k + 1]]
+            self.parents.append(parents)
+            self.strides.append(strides)
+            self.tables.append(var.valid_table.reshape(-1, var.size))
+
+    def encode(self, e):
+        """
+        Returns the assignment array of evidence e, a dictionary {Variable: value}.
+        """
+        assignment = np.full(len(self.variables), -1, dtype=np.intp)
+        for var, value in e.items():
+            assignment[self.index[var]] = value
+        return assignment
+
+    def P(self, i, value, assignment):
+        """
+        Returns P(variable i = value | parents), reading the parents' values from an assignment array.
+        """
+        return self.tables[i][self.strides[i] @ assignment[self.parents[i]], value]
+
+    def joint(self, assignments, variables=None):
+        """
+        Returns the product of the CPT entries of the given variable indices (all by default) for every row of a
+        (rows, variables) array of assignments. For complete assignments this is their joint probability.
+        """
+        p = np.ones(len(assignments))
+        for i in range(len(self.variables)) if variables is None else variables:
+            rows = assignments[:, self.parents[i]] @ self.strides[i]
+            p *= self.tables[i][rows, assignments[:, i]]
+        return p
+
+    def ancestors(self, indices):
+        """
+        Returns the sorted indices of the given variables and all their ancestors.
+        """
+        relevant = set()
+        stack = list(indices)
+        while stack:
+            i = stack.pop()
+            if i not in relevant:
+                relevant.add(i)
+                stack.extend(self.parents[i].tolist())
+        return sorted(relevant)
+
+    def enumeration_ask(self, X, e, chunk=65536):
+        """
+        Exact inference by enumeration with the same arguments and result as the notebook's enumeration_ask.
+        Barren variables are pruned, and the assignments of the hidden variables are enumerated in chunks of integer
+        arrays whose joint probabilities are summed per value of X with NumPy. This is still exponential in the number
+        of hidden variables; use elimination_ask or JunctionTree for larger networks.
+        """
+        e = {var: value for var, value in e.items() if var is not X}
+        x = self.index[X]
+        base = self.encode(e)
+        relevant = self.ancestors([x] + [self.index[var] for var in e])
+        hidden = [i for i in relevant if base[i] < 0]
+        shape = self.sizes[hidden]
+        totals = np.zeros(self.sizes[x])
+        for start in range(0, int(np.prod(shape)), chunk):
+            flat = np.arange(start, min(start + chunk, int(np.prod(shape))))
+            assignments = np.tile(base, (len(flat), 1))
+            assignments[:, hidden] = np.stack(np.unravel_index(flat, shape), axis=1)
+            totals += np.bincount(assignments[:, x], weights=self.joint(assignments, relevant), minlength=len(totals))
+        return {value: float(p) for value, p in enumerate(totals / totals.sum())}
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from ex3_utils import BayesNet, Variable
+
+def test_variable_with_bool_parent_values():
+    A = Variable("A", 0.3)
+    B = Variable("B", {True: 0.9, False: 0.2}, [A])
+    assert B.table == pytest.approx(np.array([[0.8, 0.2], [0.1, 0.9]]))
+
+def test_variable_with_bool_parent_tuples():
+    A = Variable("A", 0.3)
+    B = Variable("B", 0.6)
+    C = Variable("C", {(False, False): 0.1, (False, True): 0.4, (True, False): 0.7, (True, True): 0.95}, [A, B])
+    assert C.table[..., 1] == pytest.approx(np.array([[0.1, 0.4], [0.7, 0.95]]))
+
+def small_net():
+    A = Variable("A", 0.3)
+    B = Variable("B", {0: 0.2, 1: 0.9}, [A])
+    bnet = BayesNet()
+    bnet.add_node(A)
+    bnet.add_node(B)
+    return bnet
+
+def test_binary_network_round_trip(tmp_path):
+    path = str(tmp_path / "net.bin")
+    small_net().save_binary(path)
+    loaded = BayesNet.load_binary(path)
+    assert [var.name for var in loaded.nodes] == ["A", "B"]
+    assert loaded.get_node("B").table == pytest.approx(np.array([[0.8, 0.2], [0.1, 0.9]]))
+
+@pytest.mark.parametrize("keep, message", [(0, "too short"), (5, "too short"), (20, "bytes of metadata"),
+                                           (-8, "bytes of CPT data")])
+def test_truncated_binary_network(tmp_path, keep, message):
+    path = tmp_path / "net.bin"
+    small_net().save_binary(str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:keep])
+    with pytest.raises(ValueError, match=message):
+        BayesNet.load_binary(str(path))
+
+def test_foreign_binary_network(tmp_path):
+    path = tmp_path / "net.bin"
+    path.write_bytes(b"PK\x03\x04" + bytes(60))
+    with pytest.raises(ValueError, match="not a binary network file"):
+        BayesNet.load_binary(str(path))
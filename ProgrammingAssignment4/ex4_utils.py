@@ -1,53 +1,111 @@
+import csv
+import math
+import os
 import random
+import sqlite3
+import statistics
 import time
 import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from matplotlib import pyplot as plt
 from matplotlib import ticker as ticker
 
+INITIAL_BETS = np.array([100, 300, 400, 500, 1000, 2000, 5000, 10000]) # initial bets of Agent in the notebook
+INITIAL_BET_COUNTS = np.array([25, 15, 10, 8, 5, 3, 2, 1]) # relative frequencies of the initial bets
+DECK_RANKS = np.repeat(np.arange(2, 15, dtype=np.int8), 4) # rank values of a full deck, as given by get_value
+HISTOGRAM_BINS = 1000 # bins of the winnings histogram
+HISTOGRAM_RANGE = (0, 1200000) # range of the winnings histogram, larger winnings are only counted as overflow
+STATS_DIR = os.path.dirname(os.path.abspath(__file__)) # statistics are kept next to this module, whatever the cwd
+STATS_DB = os.path.join(STATS_DIR, "stats.db") # SQLite database holding the statistics of all agents
+STATS_FILES = { # text files in STATS_DIR the statistics used to be kept in, imported into STATS_DB
+    "PlayerAgent": "player_stats.txt",
+    "CrazyRiskSeekerAgent": "risk_seeker_stats.txt",
+    "QuitterAgent": "quitter_stats.txt",
+    "RationalAgent": "rational_stats.txt",
+    "RiskAverseAgent": "risk_averse_stats.txt"
+}
+
+RANK_VALUES = {"2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "7": 7, "8": 8, "9": 9, "10": 10, "J": 11, "Q": 12, "K": 13, "A": 14}
+FULL_DECK = tuple((rank, suit) for suit in ["♥", "♦", "♣", "♠"] for rank in RANK_VALUES) # the 52 cards in order
+MIRRORED_RANKS = {rank: mirrored for rank, mirrored in zip(RANK_VALUES, reversed(RANK_VALUES))} # 2 <-> A, 3 <-> K, ...
+
 class Deck:
     """
     Represents a standard deck of 52 playing cards.
+    Besides the list of cards, the deck keeps the number of cards of each rank value and the number of cards below
+    each value, updated on every draw, so agents can ask how many cards are higher or lower than a value in O(1).
     """
     def __init__(self):
-        self.cards = []
-        suits = ["♥", "♦", "♣", "♠"]
-        ranks = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
-        for suit in suits:
-            for rank in ranks:
-                self.cards.append((rank, suit))
+        self.cards = list(FULL_DECK)
+        self.counts = [0] * 15 # counts[value] is the number of cards of that rank value left
+        self.below = [0] * 16 # below[value] is the number of cards with a lower rank value left
+        self._reset_counts()
         self.shuffle()
 
+    def _reset_counts(self):
+        """
+        Resets the rank counts to a full deck in place.
+        """
+        for value in range(2, 15):
+            self.counts[value] = 4
+        for value in range(16):
+            self.below[value] = 4 * min(max(value - 2, 0), 13)
+
     def draw(self):
         """
         Draws a random card and removes it from the deck.
+        The last card takes the place of the drawn one, so removing it is O(1).
         """
         if not self.cards:
             return None
-        return self.cards.pop(random.randint(0, len(self.cards) - 1))
+        index = random.randint(0, len(self.cards) - 1)
+        card = self.cards[index]
+        self.cards[index] = self.cards[-1]
+        self.cards.pop()
+        value = RANK_VALUES[card[0]]
+        self.counts[value] -= 1
+        for higher in range(value + 1, 16):
+            self.below[higher] -= 1
+        return card
     
     def shuffle(self):
         random.shuffle(self.cards)
 
     def reset(self):
-        self.__init__()
+        """
+        Puts all cards back and shuffles them, reusing the existing lists.
+        """
+        self.cards[:] = FULL_DECK
+        self._reset_counts()
+        self.shuffle()
 
     def is_empty(self):
         return len(self.cards) <= 1
+
+    def count_lower(self, value):
+        """
+        Returns the number of cards left with a rank value lower than the given value.
+        """
+        return self.below[value]
+
+    def count_higher(self, value):
+        """
+        Returns the number of cards left with a rank value higher than the given value.
+        """
+        return len(self.cards) - self.below[value + 1]
+
+    def p_higher(self, value):
+        """
+        Returns the probability that the next card drawn has a rank value higher than the given value.
+        """
+        return self.count_higher(value) / len(self.cards) if self.cards else 0.0
     
 def get_value(rank):
     """
     Converts card rank to its corresponding value.
     """
-    if rank == "J":
-        return 11
-    elif rank == "Q":
-        return 12
-    elif rank == "K":
-        return 13
-    elif rank == "A":
-        return 14
-    else:
-        return int(rank)
+    return RANK_VALUES[rank]
 
 def play(agent, deck):
     """
@@ -108,9 +166,21 @@ def quick_play(agent, deck, runs):
     Logic for quickly playing multiple games with the given agent and deck.
     Also plots the winnings as a histogram and saves statistics to a file.
     """
-    winnings = []
-    sum_of_winnings = 0
+    stats = WinningsStats()
+    for winnings in _play_games(agent, deck, runs):
+        stats.add(winnings)
+    if stats.count < runs:
+        return
+    
+    update_stats(agent, stats.total, runs, stats)
+    print_stats(agent)
+    plot_winnings(agent, stats, runs)
 
+def _play_games(agent, deck, runs):
+    """
+    Plays the given number of games with the agent and deck and yields the final winnings of each game.
+    Stops early if the deck runs out of cards.
+    """
     for i in range(runs):
         deck.reset()
         if agent.__class__.__name__ == "RationalAgent" or agent.__class__.__name__ == "RiskAverseAgent":
@@ -127,8 +197,7 @@ def quick_play(agent, deck, runs):
                 agent.drawn = drawn_value
             choice = agent.get_action()
             if choice == 0:
-                winnings.append(agent.winnings)
-                sum_of_winnings += agent.winnings
+                yield agent.winnings
                 over = True
                 break
             elif choice == 1:
@@ -142,82 +211,808 @@ def quick_play(agent, deck, runs):
                         break
                     else:
                         agent._winnings = 0
-                        winnings.append(agent.winnings)
+                        yield agent.winnings
                         over = True
                         break
             else:
                 raise ValueError(f"Invalid action: {choice}. Choose 'd' to draw or 'q' to quit.")
-    
-    update_stats(agent, sum_of_winnings, runs)
-    print_stats(agent)
 
-    # Plot the winnings as a histogram
+def plot_winnings(agent, stats, runs):
+    """
+    Plots the winnings of the given agent as a histogram.
+    stats is a WinningsStats, or an array of the winnings of every game.
+    """
+    if not isinstance(stats, WinningsStats):
+        winnings = stats
+        stats = WinningsStats()
+        stats.add_many(winnings)
     plt.figure(figsize=(18, 6))
-    unique_winnings = len(set(winnings))
     plt.xlim(0, 1200000)
     plt.ylim(1, 1000000)
     plt.yscale('log')
-    plt.hist(winnings, bins=1000, range=(0, 1200000), edgecolor='blue')
+    plt.hist(stats.edges[:-1], bins=stats.edges, weights=stats.histogram, edgecolor='blue')
     plt.title(f"{agent.__class__.__name__} winnings over {runs} runs")
     plt.xlabel("Winnings")
     plt.ylabel("Frequency (log scale)")
     plt.grid(True)
     plt.gca().xaxis.set_major_formatter(ticker.StrMethodFormatter('{x:.0f}'))
-   
-def update_stats(agent, sum_of_winnings, runs):
+
+class QuantileSketch:
     """
-    Utility for updating the statistics file for the given agent.
+    Approximate quantiles of non-negative values in constant memory.
+    Positive values are counted in logarithmic buckets, so any quantile is returned with at most the given relative
+    error, and zeros are counted separately. Two sketches with the same accuracy merge exactly by adding their counts.
     """
-    agent_name = agent.__class__.__name__
-    file_map = {
-        "PlayerAgent": "player_stats.txt",
-        "CrazyRiskSeekerAgent": "risk_seeker_stats.txt",
-        "QuitterAgent": "quitter_stats.txt",
-        "RationalAgent": "rational_stats.txt",
-        "RiskAverseAgent": "risk_averse_stats.txt"
-    }
-    file = file_map.get(agent_name)
-    if not file:
-        raise ValueError(f"Unknown agent type: {agent_name}")
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.zeros = 0 # number of values equal to 0
+        self.buckets = {} # bucket index -> number of values in it
+        self.count = 0
+
+    def add(self, value, count=1):
+        if value < 0:
+            raise ValueError(f"Invalid value: {value}. QuantileSketch only holds non-negative values.")
+        if value == 0:
+            self.zeros += count
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        if (values < 0).any():
+            raise ValueError("Invalid values: QuantileSketch only holds non-negative values.")
+        self.zeros += int((values == 0).sum())
+        indices = np.ceil(np.log(values[values > 0]) / self.log_gamma).astype(np.int64)
+        for index, count in zip(*np.unique(indices, return_counts=True)):
+            self.buckets[int(index)] = self.buckets.get(int(index), 0) + int(count)
+        self.count += len(values)
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        self.zeros += other.zeros
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """
+        Returns the approximate q-quantile (0 <= q <= 1) of the values added.
+        """
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
 
+class WinningsStats:
+    """
+    Streaming statistics of the winnings of many games, using the same memory however many games are added.
+    Keeps the count, the exact sum, the minimum and maximum, the mean and variance (Welford), a fixed-bin histogram and
+    a QuantileSketch. Statistics gathered separately, e.g. in different processes, merge exactly with merge.
+    """
+    def __init__(self, bins=HISTOGRAM_BINS, range=HISTOGRAM_RANGE, relative_accuracy=0.01):
+        self.count = 0
+        self.total = 0 # exact sum of the winnings
+        self.mean = 0.0
+        self.m2 = 0.0 # sum of squared differences from the mean
+        self.min = math.inf
+        self.max = -math.inf
+        self.edges = np.linspace(range[0], range[1], bins + 1)
+        self.histogram = np.zeros(bins, dtype=np.int64)
+        self.overflow = 0 # number of winnings outside the histogram range
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, winnings):
+        """
+        Adds the winnings of one game.
+        """
+        self.count += 1
+        self.total += winnings
+        delta = winnings - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (winnings - self.mean)
+        self.min = min(self.min, winnings)
+        self.max = max(self.max, winnings)
+        low, high = self.edges[0], self.edges[-1]
+        if low <= winnings <= high:
+            index = min(int((winnings - low) * len(self.histogram) / (high - low)), len(self.histogram) - 1)
+            self.histogram[index] += 1
+        else:
+            self.overflow += 1
+        self.sketch.add(winnings)
+
+    def add_many(self, winnings):
+        """
+        Adds the winnings of many games at once, given as an array.
+        """
+        winnings = np.asarray(winnings)
+        if not len(winnings):
+            return
+        other = WinningsStats(len(self.histogram), (self.edges[0], self.edges[-1]), self.sketch.relative_accuracy)
+        other.count = len(winnings)
+        other.total = int(winnings.sum())
+        other.mean = float(winnings.mean())
+        other.m2 = float(((winnings - other.mean) ** 2).sum())
+        other.min = winnings.min().item()
+        other.max = winnings.max().item()
+        other.histogram, _ = np.histogram(winnings, bins=self.edges)
+        other.overflow = other.count - int(other.histogram.sum())
+        other.sketch.add_many(winnings)
+        self.merge(other)
+
+    def merge(self, other):
+        """
+        Adds the statistics of other to these statistics. Both must use the same histogram bins.
+        """
+        if len(other.histogram) != len(self.histogram) or not np.array_equal(other.edges, self.edges):
+            raise ValueError("Only statistics with the same histogram bins can be merged")
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+        self.overflow += other.overflow
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def standard_error(self):
+        return self.std / math.sqrt(self.count) if self.count else math.nan
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def summary(self):
+        return (
+            f"Runs: {self.count}\n"
+            f"Average winnings: {self.mean:.1f} ± {1.96 * self.standard_error:.1f}\n"
+            f"Standard deviation: {self.std:.1f}\n"
+            f"Median: {self.quantile(0.5):.0f}, 90%: {self.quantile(0.9):.0f}, 99%: {self.quantile(0.99):.0f}\n"
+            f"Max winnings: {self.max}"
+        )
+
+def _seeds(seed, count):
+    """
+    Returns count seeds for the random module, all derived from seed.
+    """
+    return [int(state) for state in np.random.SeedSequence(seed).generate_state(count, dtype=np.uint64)]
+
+def _play_shard(agent, runs, seed):
+    """
+    Plays a share of a parallel_quick_play in a worker process and returns the statistics of its games.
+    The worker's deck and agent draw from the random module, which is seeded for the shard.
+    """
+    random.seed(seed)
+    stats = WinningsStats()
+    for winnings in _play_games(agent, Deck(), runs):
+        stats.add(winnings)
+    return stats
+
+def parallel_quick_play(agent, runs, workers=None, seed=None, shard_size=50000, plot=True):
+    """
+    Equivalent of quick_play that plays the games in worker processes and returns their merged WinningsStats.
+    The runs are split into shards of shard_size games, each played with its own seed derived from seed, so the
+    results do not depend on the number of workers. Every worker only keeps streaming statistics of its games, so
+    the memory used does not grow with runs.
+    The agent is sent to the workers with pickle, so agents defined in a notebook need the fork start method.
+    """
+    seed = seed if seed is not None else random.randrange(2 ** 63)
+    shards = [min(shard_size, runs - start) for start in range(0, runs, shard_size)]
+    stats = WinningsStats()
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_play_shard, agent, shard, shard_seed)
+                   for shard, shard_seed in zip(shards, _seeds(seed, len(shards)))]
+        for future in as_completed(futures):
+            stats.merge(future.result())
+
+    update_stats(agent, stats.total, stats.count, stats)
+    print_stats(agent)
+    if plot:
+        plot_winnings(agent, stats, stats.count)
+    return stats
+
+class AntitheticDeck(Deck):
+    """
+    Deck that deals the antithetic game of a Deck seeded the same way: every card drawn has the mirrored rank
+    (2 instead of A, 3 instead of K, ...), so high cards come where the other deck has low ones.
+    """
+    def reset(self):
+        super().reset()
+        self.cards[:] = [(MIRRORED_RANKS[rank], suit) for rank, suit in self.cards]
+
+class RunningMoments:
+    """
+    Running count, mean and variance of a stream of values (Welford), updated a batch at a time.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # sum of squared differences from the mean
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+        count = self.count + len(values)
+        mean = values.mean()
+        delta = mean - self.mean
+        self.m2 += ((values - mean) ** 2).sum() + delta ** 2 * self.count * len(values) / count
+        self.mean += delta * len(values) / count
+        self.count = count
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else math.inf
+
+    @property
+    def standard_error(self):
+        return math.sqrt(self.variance / self.count) if self.count else math.inf
+
+    def interval(self, z):
+        """
+        Returns the confidence interval of the mean for the given normal quantile z.
+        """
+        half_width = z * self.standard_error
+        return self.mean - half_width, self.mean + half_width
+
+class AgentComparison:
+    """
+    Result of compare_agents: the winnings of each agent and the paired differences between every two agents over
+    the same games.
+    """
+    def __init__(self, names, alpha):
+        self.names = names
+        self.alpha = alpha
+        self.games = 0 # number of common games (pairs of antithetic games count once)
+        self.winnings = {name: RunningMoments() for name in names}
+        self.differences = {(a, b): RunningMoments() for i, a in enumerate(names) for b in names[i + 1:]}
+        self.resolved = False
+
+    def add_batch(self, results):
+        """
+        Adds the winnings of a batch of common games, given as an array with one row per agent.
+        """
+        for name, row in zip(self.names, results):
+            self.winnings[name].add_many(row)
+        for (a, b), moments in self.differences.items():
+            moments.add_many(results[self.names.index(a)] - results[self.names.index(b)])
+        self.games += results.shape[1]
+
+    def difference(self, a, b):
+        """
+        Returns the RunningMoments of the winnings of a minus the winnings of b, and the sign to apply to them.
+        """
+        if (a, b) in self.differences:
+            return self.differences[a, b], 1
+        return self.differences[b, a], -1
+
+    @property
+    def z(self):
+        """
+        Normal quantile of the confidence intervals, Bonferroni corrected for the adjacent pairs of the ranking.
+        """
+        return statistics.NormalDist().inv_cdf(1 - self.alpha / (2 * max(len(self.names) - 1, 1)))
+
+    def interval(self, a, b):
+        """
+        Returns the confidence interval of the mean difference between the winnings of a and b.
+        """
+        moments, sign = self.difference(a, b)
+        low, high = moments.interval(self.z)
+        return (low, high) if sign > 0 else (-high, -low)
+
+    def ranking(self):
+        """
+        Returns the agent names from the highest to the lowest average winnings.
+        """
+        return sorted(self.names, key=lambda name: self.winnings[name].mean, reverse=True)
+
+    def is_resolved(self):
+        """
+        Returns True if every agent of the ranking is significantly better than the next one.
+        """
+        ranking = self.ranking()
+        return all(self.interval(a, b)[0] > 0 for a, b in zip(ranking, ranking[1:]))
+
+    def summary(self):
+        ranking = self.ranking()
+        lines = [f"{self.games} common games, ranking {'resolved' if self.resolved else 'not resolved'}:"]
+        for name in ranking:
+            moments = self.winnings[name]
+            lines.append(f"  {name}: average winnings {moments.mean:.1f} ± {self.z * moments.standard_error:.1f}")
+        for a, b in zip(ranking, ranking[1:]):
+            low, high = self.interval(a, b)
+            moments, _ = self.difference(a, b)
+            independent = self.winnings[a].variance + self.winnings[b].variance
+            ratio = independent / moments.variance if moments.variance else math.inf
+            lines.append(f"  {a} - {b}: {(low + high) / 2:.1f} in [{low:.1f}, {high:.1f}], "
+                         f"{ratio:.1f}x fewer games than independent runs")
+        return "\n".join(lines)
+
+def compare_agents(agents, seed=None, batch_size=1000, alpha=0.05, min_games=2000, max_games=1000000,
+                   antithetic=True):
+    """
+    Compares agents by playing all of them on the same games (common random numbers) and stops as soon as their
+    ranking by average winnings is statistically resolved, or after max_games games.
+    agents is a list of agents, or a dict of agents by name. Every game gets its own seed, derived from seed, and the
+    random module is seeded with it before each agent plays the game, so every agent gets the same initial bet and
+    draws the same cards while it keeps drawing. With antithetic, each game is also played with an AntitheticDeck and
+    the two winnings are averaged.
+    The ranking is resolved when the confidence interval at level 1 - alpha (Bonferroni corrected) of the paired
+    difference between every two neighbours of the ranking excludes 0. It is checked after every batch of games once
+    min_games were played, which makes the intervals somewhat optimistic; a smaller alpha compensates for that.
+    Returns an AgentComparison.
+    """
+    if not isinstance(agents, dict):
+        agents = {agent.__class__.__name__: agent for agent in agents}
+    if len(agents) < 2:
+        raise ValueError("compare_agents needs at least two agents")
+    if "PlayerAgent" in [agent.__class__.__name__ for agent in agents.values()]:
+        raise ValueError("PlayerAgent asks for input on every decision and cannot be compared")
+    seed = seed if seed is not None else random.randrange(2 ** 63)
+    decks = [Deck(), AntitheticDeck()] if antithetic else [Deck()]
+    comparison = AgentComparison(list(agents), alpha)
+    state = random.getstate()
     try:
-        with open(file, "r") as f_read:
-            contents = re.split(r":|\n", f_read.read().strip())
-            contents = [c.strip() for c in contents if c.strip()]
-            prev_winnings = int(contents[1])
-            prev_runs = int(contents[3])
-            total_winnings = prev_winnings + sum_of_winnings
-            total_runs = prev_runs + runs
-    except FileNotFoundError:
-        total_winnings = sum_of_winnings
-        total_runs = runs
+        batch = 0
+        while comparison.games < max_games:
+            games = min(batch_size, max_games - comparison.games)
+            results = np.zeros((len(agents), games))
+            played = np.ones(games, dtype=bool)
+            for game, game_seed in enumerate(_seeds([seed, batch], games)):
+                for i, agent in enumerate(agents.values()):
+                    for deck in decks:
+                        random.seed(game_seed)
+                        winnings = next(_play_games(agent, deck, 1), None)
+                        if winnings is None: # the deck ran out, leave the game out for every agent
+                            played[game] = False
+                            break
+                        results[i, game] += winnings / len(decks)
+            comparison.add_batch(results[:, played])
+            batch += 1
+            if comparison.games >= min_games and comparison.is_resolved():
+                comparison.resolved = True
+                break
     finally:
-        with open(file, "w") as f_write:
-            f_write.write(
-                f"Winnings: {total_winnings}\n"
-                f"Runs: {total_runs}\n"
-                f"Average winnings: {round(total_winnings / total_runs)}"
-            )
+        random.setstate(state)
+    return comparison
+
+def _quitter_policy(winnings, higher, remaining):
+    return np.zeros(len(winnings), dtype=bool)
+
+def _risk_seeker_policy(winnings, higher, remaining):
+    return winnings <= 1_000_000
+
+def _rational_policy(winnings, higher, remaining):
+    p_higher = higher / remaining
+    return p_higher * (winnings * 2) > winnings
+
+def _risk_averse_policy(winnings, higher, remaining):
+    p_higher = higher / remaining
+    with np.errstate(divide="ignore"):
+        U_win = np.where(winnings * 2 <= 0, 0, np.log(winnings * 2 + 1))
+        U_stop = np.where(winnings <= 0, 0, np.log(winnings + 1))
+    return p_higher * U_win > U_stop
+
+# Vectorized versions of the agents' get_action. Each takes arrays of winnings, the number of cards higher than the
+# drawn card left in the deck and the number of cards left, and returns True where the agent draws.
+POLICIES = {
+    "QuitterAgent": _quitter_policy,
+    "CrazyRiskSeekerAgent": _risk_seeker_policy,
+    "RationalAgent": _rational_policy,
+    "RiskAverseAgent": _risk_averse_policy,
+}
+
+def simulate(agent, runs, rng=None, batch_size=100000):
+    """
+    Plays the given number of games for the agent's type at once with NumPy and returns the final winnings of each game.
+    Each deck is an array with the number of cards left of each rank value, and a card is drawn by picking a random
+    position among the remaining cards. The agent's decisions are made for all games of a batch at once with the
+    matching entry of POLICIES.
+    A game whose deck runs out ends with its current winnings (quick_play stops the whole run instead).
+    """
+    agent_name = agent if isinstance(agent, str) else agent.__class__.__name__
+    if agent_name == "PlayerAgent":
+        raise ValueError("PlayerAgent asks for input on every decision and cannot be simulated")
+    policy = POLICIES.get(agent_name)
+    if policy is None:
+        raise ValueError(f"Unknown agent type: {agent_name}")
+    rng = rng if rng is not None else np.random.default_rng()
+    results = np.empty(runs, dtype=np.int64)
+    for start in range(0, runs, batch_size):
+        games = min(batch_size, runs - start)
+        results[start:start + games] = _simulate_batch(policy, games, rng)
+    return results
+
+def _draw_cards(counts, games, remaining, rng):
+    """
+    Draws one random card from the deck of each of the given games and returns the rank values drawn.
+    All the decks have the same number of remaining cards.
+    """
+    cumulative = counts[games].cumsum(axis=1)
+    position = rng.integers(0, remaining, size=len(games))
+    drawn = (cumulative <= position[:, None]).sum(axis=1)
+    counts[games, drawn] -= 1
+    return drawn
+
+def _simulate_batch(policy, games, rng):
+    """
+    Plays one batch of games with the given vectorized policy and returns their final winnings.
+    """
+    counts = np.zeros((games, 15), dtype=np.int16) # cards of each rank value left in each deck
+    counts[:, 2:] = 4
+    winnings = rng.choice(INITIAL_BETS, size=games, p=INITIAL_BET_COUNTS / INITIAL_BET_COUNTS.sum())
+    remaining = len(DECK_RANKS) # every game that is still playing has the same number of cards left
+    playing = np.arange(games)
+    values = np.arange(15)
+    while len(playing) and remaining > 1:
+        drawn = _draw_cards(counts, playing, remaining, rng)
+        remaining -= 1
+        higher = (counts[playing] * (values > drawn[:, None])).sum(axis=1)
+        draw = policy(winnings[playing], higher, remaining)
+        playing = playing[draw]
+        drawn = drawn[draw]
+        if not len(playing):
+            break
+        yours = _draw_cards(counts, playing, remaining, rng)
+        remaining -= 1
+        winnings[playing[yours > drawn]] *= 2
+        lost = yours < drawn
+        winnings[playing[lost]] = 0
+        playing = playing[~lost]
+    return winnings
+
+def fast_quick_play(agent, runs, rng=None):
+    """
+    Equivalent of quick_play that plays all games with simulate instead of one at a time.
+    Saves the statistics to the agent's file, prints them and plots the histogram like quick_play.
+    """
+    stats = WinningsStats()
+    stats.add_many(simulate(agent, runs, rng))
+    update_stats(agent, stats.total, runs, stats)
+    print_stats(agent)
+    plot_winnings(agent, stats, runs)
+
+def deck_counts(deck):
+    """
+    Returns the number of cards of each rank value (2 to 14) left in the deck, as a tuple.
+    """
+    return tuple(deck.counts[2:])
+
+class BoundedPolicySolver:
+    """
+    Dynamic-programming solution of Double or Nothing, for any non-decreasing utility function U, limited to the
+    given number of betting rounds: after that many draws the agent must quit. The policy found is the best among the
+    policies that play at most that many rounds, not the optimal policy of the real game, and its expected utility
+    can be lower than that of an agent without the limit (with U(w) = w and 3 rounds, about 1090 against the
+    roughly 1250 of RationalAgent). The number of states grows about twentyfold with each round (4 rounds take
+    around a minute), so the unlimited game (rounds=None) can only be solved for small decks.
+    A state is the number of cards of each rank left in the deck and the current winnings, so suits are never told
+    apart and games that reach the same winnings from different initial bets share states. Values are memoized per
+    state, and a draw is never explored when even doubling on every remaining round could not beat quitting.
+    The best actions are collected in a lookup table keyed by (deck counts after the drawn card, drawn value,
+    winnings), which get_action queries in O(1).
+    """
+    def __init__(self, U, rounds, deck=None):
+        self.U = U
+        self.rounds = rounds # maximum number of draws, None for no limit
+        self.deck = tuple(deck) if deck is not None else (4,) * 13 # cards of each rank value 2..14 at the start
+        self.size = sum(self.deck)
+        self.values = {} # (counts, winnings) -> expected utility of playing the best policy before the next card is drawn
+        self.actions = {} # (counts after the draw, drawn value, winnings) -> 1 to draw, 0 to quit
+
+    def _rounds_left(self, cards):
+        """
+        Returns how many more betting rounds can be played with the given number of cards left.
+        """
+        rounds = cards // 2
+        if self.rounds is not None:
+            rounds = min(rounds, self.rounds - (self.size - cards) // 2)
+        return rounds
+
+    def _value(self, counts, winnings):
+        """
+        Returns the expected utility of playing the best policy from a state before the next card is drawn.
+        """
+        key = (counts, winnings)
+        value = self.values.get(key)
+        if value is not None:
+            return value
+        U = self.U
+        stop = U(winnings)
+        lose = U(0)
+        cards = sum(counts)
+        rounds = self._rounds_left(cards)
+        value = stop
+        if rounds > 0:
+            value = 0.0
+            best_win, best_tie = U(winnings * 2 ** rounds), U(winnings * 2 ** (rounds - 1))
+            for x in range(13):
+                if not counts[x]:
+                    continue
+                after = list(counts)
+                after[x] -= 1
+                higher = sum(after[x + 1:])
+                lower = sum(after[:x])
+                draw = stop # a draw that cannot beat quitting is never explored
+                if (higher * best_win + after[x] * best_tie + lower * lose) / (cards - 1) > stop:
+                    draw = lower / (cards - 1) * lose
+                    for y in range(x, 13):
+                        if after[y]:
+                            following = list(after)
+                            following[y] -= 1
+                            draw += after[y] / (cards - 1) * self._value(tuple(following), winnings * 2 if y > x else winnings)
+                action = 1 if draw > stop else 0
+                self.actions[tuple(after), x + 2, winnings] = action
+                value += counts[x] / cards * (draw if action else stop)
+        self.values[key] = value
+        return value
+
+    def value(self, winnings):
+        """
+        Returns the exact expected utility of the best policy within the round limit from the full deck with the given
+        initial winnings.
+        """
+        return self._value(self.deck, winnings)
+
+    def expected_utility(self):
+        """
+        Returns the exact expected utility of the best policy within the round limit over the initial bets of the
+        notebook's Agent.
+        """
+        weights = INITIAL_BET_COUNTS / INITIAL_BET_COUNTS.sum()
+        return float(sum(weight * self.value(int(bet)) for bet, weight in zip(INITIAL_BETS, weights)))
+
+    def get_action(self, counts, drawn, winnings):
+        """
+        Returns the best action (1 to draw, 0 to quit) given the deck counts after the drawn card was removed,
+        the drawn value and the winnings. States the solver never reached (e.g. past the round limit) quit.
+        """
+        return self.actions.get((tuple(counts), drawn, winnings), 0)
+
+    def save(self, path):
+        """
+        Writes the lookup table as CSV: the 13 deck counts, the drawn value, the winnings and the action.
+        """
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([f"count_{value}" for value in range(2, 15)] + ["drawn", "winnings", "action"])
+            for (counts, drawn, winnings), action in self.actions.items():
+                writer.writerow(list(counts) + [drawn, winnings, action])
+
+    @staticmethod
+    def load(path):
+        """
+        Reads a lookup table written by save and returns it as a dictionary like BoundedPolicySolver.actions.
+        """
+        actions = {}
+        with open(path, "r", newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                row = [int(value) for value in row]
+                actions[tuple(row[:13]), row[13], row[14]] = row[15]
+        return actions
+
+class StatsStore:
+    """
+    Append-only store of the statistics of the games played by each agent type, kept in a SQLite database in WAL mode.
+    Every call to add records one batch of games in its own transaction, so several processes can write to the same
+    database at once without losing updates. A batch holds the number of games and the sum of their winnings, and
+    when available its WinningsStats moments, histogram and quantile sketch.
+    The old text statistics files found in STATS_DIR are imported once as batches of their own, keyed on the agent
+    type and file name, so moving the checkout does not import them again.
+    """
+    def __init__(self, path=STATS_DB, import_files=True):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS batches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                agent TEXT NOT NULL,
+                runs INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                mean REAL, m2 REAL, min INTEGER, max INTEGER, overflow INTEGER, zeros INTEGER,
+                bins INTEGER, low REAL, high REAL, relative_accuracy REAL,
+                source TEXT,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS batches_agent ON batches (agent);
+            CREATE UNIQUE INDEX IF NOT EXISTS batches_source ON batches (source);
+            CREATE TABLE IF NOT EXISTS histogram (batch INTEGER NOT NULL, bin INTEGER NOT NULL, count INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS histogram_batch ON histogram (batch);
+            CREATE TABLE IF NOT EXISTS sketch (batch INTEGER NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS sketch_batch ON sketch (batch);
+        """)
+        if import_files:
+            for agent_name, file in STATS_FILES.items():
+                self.import_text(agent_name, os.path.join(STATS_DIR, file))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, agent_name, runs, total, stats=None, source=None):
+        """
+        Records a batch of runs games of the given agent type whose winnings add up to total.
+        Returns the id of the batch, or None if a batch with the same source was already recorded.
+        """
+        if agent_name not in STATS_FILES:
+            raise ValueError(f"Unknown agent type: {agent_name}")
+        row = [agent_name, int(runs), int(total)] + [None] * 10 + [source, time.time()]
+        if stats is not None and stats.count:
+            row[3:13] = [stats.mean, stats.m2, stats.min, stats.max, stats.overflow, stats.sketch.zeros,
+                         len(stats.histogram), float(stats.edges[0]), float(stats.edges[-1]),
+                         stats.sketch.relative_accuracy]
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("INSERT OR IGNORE INTO batches (agent, runs, total, mean, m2, min, max, overflow, zeros, bins, low, high, "
+                           "relative_accuracy, source, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            batch = cursor.lastrowid if cursor.rowcount else None
+            if batch is not None and stats is not None and stats.count:
+                bins = np.flatnonzero(stats.histogram)
+                cursor.executemany("INSERT INTO histogram VALUES (?, ?, ?)",
+                                   [(batch, int(b), int(stats.histogram[b])) for b in bins])
+                cursor.executemany("INSERT INTO sketch VALUES (?, ?, ?)",
+                                   [(batch, bucket, count) for bucket, count in stats.sketch.buckets.items()])
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return batch
+
+    def import_text(self, agent_name, file):
+        """
+        Imports a text statistics file written by the old update_stats as one batch, unless it was imported already.
+        Returns True if the file was imported. The unique source makes the import happen once even when several
+        processes open a new store at the same time.
+        """
+        if not os.path.exists(file):
+            return False
+        source = f"{agent_name}:{os.path.basename(file)}"
+        if self.connection.execute("SELECT 1 FROM batches WHERE source = ?", (source,)).fetchone():
+            return False
+        runs, total = _read_text_stats(file)
+        return self.add(agent_name, runs, total, source=source) is not None
+
+    def summary(self, agent_name):
+        """
+        Returns the total number of games and the total winnings recorded for the given agent type.
+        """
+        runs, total = self.connection.execute(
+            "SELECT COALESCE(SUM(runs), 0), COALESCE(SUM(total), 0) FROM batches WHERE agent = ?", (agent_name,)
+        ).fetchone()
+        return runs, total
+
+    def stats(self, agent_name, bins=HISTOGRAM_BINS, range=HISTOGRAM_RANGE, relative_accuracy=0.01):
+        """
+        Returns the merged WinningsStats of all batches of the given agent type that recorded them with the given
+        histogram bins and sketch accuracy. Batches that only hold totals (like imported files) are left out.
+        """
+        stats = WinningsStats(bins, range, relative_accuracy)
+        condition = "agent = ? AND m2 IS NOT NULL AND bins = ? AND low = ? AND high = ? AND relative_accuracy = ?"
+        parameters = (agent_name, bins, float(range[0]), float(range[1]), relative_accuracy)
+        batches = self.connection.execute(
+            f"SELECT runs, total, mean, m2, min, max, overflow, zeros FROM batches WHERE {condition}", parameters
+        ).fetchall()
+        for runs, total, mean, m2, low, high, overflow, zeros in batches:
+            batch = WinningsStats(bins, range, relative_accuracy)
+            batch.count, batch.total, batch.mean, batch.m2, batch.min, batch.max = runs, total, mean, m2, low, high
+            stats.merge(batch)
+        if not batches:
+            return stats
+        stats.overflow, stats.sketch.zeros = self.connection.execute(
+            f"SELECT SUM(overflow), SUM(zeros) FROM batches WHERE {condition}", parameters
+        ).fetchone()
+        for b, count in self.connection.execute(
+            f"SELECT bin, SUM(count) FROM histogram WHERE batch IN (SELECT id FROM batches WHERE {condition}) "
+            "GROUP BY bin", parameters
+        ):
+            stats.histogram[b] = count
+        for bucket, count in self.connection.execute(
+            f"SELECT bucket, SUM(count) FROM sketch WHERE batch IN (SELECT id FROM batches WHERE {condition}) "
+            "GROUP BY bucket", parameters
+        ):
+            stats.sketch.buckets[bucket] = count
+        stats.sketch.count = stats.count
+        return stats
+
+def _read_text_stats(file):
+    """
+    Returns the number of games and the total winnings in a text statistics file written by the old update_stats.
+    """
+    with open(file, "r") as f_read:
+        contents = re.split(r":|\n", f_read.read().strip())
+        contents = [c.strip() for c in contents if c.strip()]
+    return int(contents[3]), int(contents[1])
+
+_store = None # StatsStore shared by update_stats and print_stats, opened on first use
+
+def _shared_store(create=True):
+    """
+    Returns the StatsStore shared by update_stats and print_stats, so the database is opened and the old text files
+    are imported once per process. With create=False, None is returned while the database does not exist yet.
+    """
+    global _store
+    if _store is None:
+        if not create and not os.path.exists(STATS_DB):
+            return None
+        _store = StatsStore(STATS_DB)
+    return _store
+
+def update_stats(agent, sum_of_winnings, runs, stats=None):
+    """
+    Utility for recording the statistics of games played by the given agent in the statistics database.
+    stats is the WinningsStats of the games, if they were kept.
+    """
+    agent_name = agent.__class__.__name__
+    if agent_name not in STATS_FILES:
+        raise ValueError(f"Unknown agent type: {agent_name}")
+    if stats is None and runs == 1:
+        stats = WinningsStats()
+        stats.add(sum_of_winnings)
+
+    _shared_store().add(agent_name, runs, sum_of_winnings, stats)
 
 def print_stats(agent):
     """
     Utility for printing the statistics of the given agent.
+    Before the statistics database exists, the old text file of the agent is read instead, without creating it.
     """
     agent_name = agent.__class__.__name__
-    file_map = {
-        "PlayerAgent": "player_stats.txt",
-        "CrazyRiskSeekerAgent": "risk_seeker_stats.txt",
-        "QuitterAgent": "quitter_stats.txt",
-        "RationalAgent": "rational_stats.txt",
-        "RiskAverseAgent": "risk_averse_stats.txt"
-    }
-    file = file_map.get(agent_name)
-    if not file:
+    if agent_name not in STATS_FILES:
         raise ValueError(f"Unknown agent type: {agent_name}")
 
-    try:
-        with open(file, "r") as f_read:
-            contents = f_read.read().strip()
-            print(contents)
-    except FileNotFoundError:
-        print(f"No statistics found for {agent_name}.")
\ No newline at end of file
+    store = _shared_store(create=False)
+    file = os.path.join(STATS_DIR, STATS_FILES[agent_name])
+    if store is not None:
+        total_runs, total_winnings = store.summary(agent_name)
+    elif os.path.exists(file):
+        total_runs, total_winnings = _read_text_stats(file)
+    else:
+        total_runs = 0
+    if not total_runs:
+        print(f"No statistics found for {agent_name}.")
+        return
+    print(
+        f"Winnings: {total_winnings}\n"
+        f"Runs: {total_runs}\n"
+        f"Average winnings: {round(total_winnings / total_runs)}"
+    )
+    stats = store.stats(agent_name) if store is not None else None
+    if stats is not None and stats.count > 1:
+        print(f"Over the {stats.count} runs with recorded distributions:\n{stats.summary()}")
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import ex4_utils
+from ex4_utils import BoundedPolicySolver, StatsStore, print_stats
+
+SMALL_DECK = (2, 1, 1, 0, 0, 1, 0, 0, 0, 0, 1, 0, 1) # cards of each rank value 2..14
+
+def brute_force_value(cards, winnings, U):
+    """
+    Expected utility of playing optimally with the given list of card values, before the next card is drawn.
+    """
+    if len(cards) <= 1:
+        return U(winnings)
+    total = 0.0
+    for i, drawn in enumerate(cards):
+        rest = cards[:i] + cards[i + 1:]
+        draw = 0.0
+        for j, yours in enumerate(rest):
+            following = rest[:j] + rest[j + 1:]
+            if yours < drawn:
+                draw += U(0)
+            elif yours > drawn:
+                draw += brute_force_value(following, winnings * 2, U)
+            else:
+                draw += brute_force_value(following, winnings, U)
+        total += max(U(winnings), draw / len(rest))
+    return total / len(cards)
+
+@pytest.mark.parametrize("U", [lambda w: w, lambda w: w - 500, lambda w: w + 500, lambda w: min(w, 300) - 200])
+def test_bounded_policy_solver_matches_brute_force(U):
+    cards = [value + 2 for value, count in enumerate(SMALL_DECK) for _ in range(count)]
+    solver = BoundedPolicySolver(U, rounds=None, deck=SMALL_DECK)
+    assert solver.value(100) == pytest.approx(brute_force_value(cards, 100, U))
+
+PlayerAgent = type("PlayerAgent", (), {}) # stands in for the agent of the notebook, only its class name is used
+
+def write_text_stats(path, winnings, runs):
+    path.write_text(f"Winnings: {winnings}\nRuns: {runs}\nAverage winnings: {round(winnings / runs)}")
+
+def test_stats_store_imports_moved_text_file_once(tmp_path):
+    for checkout in ("a", "b"):
+        os.mkdir(tmp_path / checkout)
+        write_text_stats(tmp_path / checkout / "player_stats.txt", 500, 2)
+    with StatsStore(str(tmp_path / "stats.db"), import_files=False) as store:
+        assert store.import_text("PlayerAgent", str(tmp_path / "a" / "player_stats.txt"))
+        assert not store.import_text("PlayerAgent", str(tmp_path / "b" / "player_stats.txt"))
+        assert store.summary("PlayerAgent") == (2, 500)
+
+def test_print_stats_does_not_create_database(tmp_path, monkeypatch, capsys):
+    write_text_stats(tmp_path / "player_stats.txt", 500, 2)
+    monkeypatch.setattr(ex4_utils, "STATS_DIR", str(tmp_path))
+    monkeypatch.setattr(ex4_utils, "STATS_DB", str(tmp_path / "stats.db"))
+    monkeypatch.setattr(ex4_utils, "_store", None)
+    print_stats(PlayerAgent())
+    assert "Runs: 2" in capsys.readouterr().out
+    assert not os.path.exists(tmp_path / "stats.db")
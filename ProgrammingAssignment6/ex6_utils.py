@@ -7,9 +7,10 @@ class Node:
     Represents a node in the grid.
     """
     def __init__(self, grid, coords, carrying_key, goal=False, initial=False, blocked=False):
+        self.grid = grid # a reference to the grid where this node is located
+        self._epoch = grid.epoch # grid epoch in which current was last reset
         self.coords = coords # coordinates represented as (x, y)
         self.successors = [] # list of Node objects
-        self.grid = grid # a reference to the grid where this node is located
         self.parent = None # Node object
         self.action = None # string representing the action taken to reach this node from the parent node
         self.initial = initial # boolean indicating whether this node is the initial state
@@ -54,20 +55,38 @@ class Node:
                 return None
         return None
     
+    @property
+    def current(self):
+        """
+        Boolean indicating whether this node is the current state, reset lazily after Grid.reset.
+        """
+        if self._epoch != self.grid.epoch:
+            self.reset()
+        return self._current
+
+    @current.setter
+    def current(self, value):
+        if self._epoch != self.grid.epoch:
+            self.reset()
+        self._current = value
+
     def reset(self):
         """
         Resets the node's properties to their initial state.
         """
+        self._epoch = self.grid.epoch
         self.successors = []
         self.parent = None
-        self.current = False
+        self._current = False
         if self.initial:
-            self.current = True
+            self._current = True
         self.action = None
         if self.trap:
             self.lava = False
         if self.vertical_door or self.horizontal_door:
             self.locked = True
+        if self is self.grid.key_square:
+            self.has_key = True
 
     def goal_test(self):
         """
@@ -93,6 +112,8 @@ class Grid:
         self.search_delay = 0.1
         self.node_count = 0
         self.key_square = None
+        self.epoch = 0 # episode generation, advanced on every reset
+        self._episode_nodes = [] # nodes with a door, trap or key, whose state changes during an episode
 
     def generate_nodes(self, carrying_key):
         """
@@ -143,6 +164,8 @@ class Grid:
                     (node.coords[0] == 10 and node.coords[1] == 4)
                 ):
                     node.trap = True
+                if node.vertical_door or node.horizontal_door or node.trap or node.has_key:
+                    self._episode_nodes.append(node)
                 self.node_count += 1
                 node.id = self.node_count
                 row.append(node)
@@ -166,16 +189,12 @@ class Grid:
 
     def reset(self):
         """
-        Resets the grid to its initial state by resetting all nodes and the expansion count.
+        Resets the grid to its initial state by resetting the doors, traps and key and the expansion count.
+        The other nodes only need their current state reset, which they do the next time it is used.
         """
-        for row in self.nodes:
-            for node in row:
-                if node == self.key_square:
-                    node.has_key = True
-                node.reset()
-        for row in self.nodes2:
-            for node in row:
-                node.reset()
+        self.epoch += 1
+        for node in self._episode_nodes:
+            node.reset()
         self.expansions = 0
 
     def visualize(self, agent, delay=0):